@@ -0,0 +1,171 @@
+import pandas as pd
+
+from grading import add_grades
+
+# =====================================
+# Aggregate cube (Term x Student x Skill)
+# =====================================
+TERM, STUDENT, SKILL = "Term", "Student Name", "Skill"
+
+
+class AggregateCube:
+    """Score sums/counts per (Term, Student, Skill) plus grade counts per (Term, Student).
+
+    Built once per subject table and patched row by row when edits are
+    applied (update_rows). Every dashboard figure (growth, success rate,
+    donut, insight cards) is a slice of it, so reruns never re-melt or
+    re-group the raw rows. Means are always taken as sum / count, which gives
+    the same result as averaging the raw scores.
+    """
+
+    def __init__(self, df, skills):
+        self.skills = list(skills)
+        self.data_columns = list(df.columns)
+        self.version = 0  # bumped on every patch; lets other caches key on it
+        # Per-row Average/Grade/Remarks, kept in step with the aggregates
+        self.rows = add_grades(df.copy(), self.skills)
+        self.cells, self.grades = self._aggregate(self.rows)
+
+    def _aggregate(self, rows):
+        # Plain object keys (not categoricals) so deltas with new names/terms line up
+        keyed = rows.astype({TERM: object, STUDENT: object})
+        long = keyed.melt(id_vars=[TERM, STUDENT], value_vars=self.skills, var_name=SKILL, value_name="Score")
+        cells = long.groupby([TERM, STUDENT, SKILL], dropna=False)["Score"].agg(["sum", "count"])
+        grades = keyed.groupby([TERM, STUDENT, "Grade"], dropna=False).size().rename("count")
+        return cells, grades
+
+    # --- Incremental maintenance ---
+    def update_rows(self, labels, master):
+        """Re-grades only the given master rows and patches the affected aggregates."""
+        if len(labels) == 0:
+            return
+        self.version += 1
+        old = self.rows.loc[labels]
+        new = add_grades(master.loc[labels, self.data_columns].copy(), self.skills)
+
+        old_cells, old_grades = self._aggregate(old)
+        new_cells, new_grades = self._aggregate(new)
+        self.cells = _merge_delta(self.cells, _combine(new_cells, old_cells))
+        self.grades = _merge_delta(self.grades, _combine(new_grades, old_grades))
+        assign_rows(self.rows, labels, new)
+
+        # Forget (Term, Student) pairs that no longer have any rows (e.g. a renamed student)
+        self.grades = self.grades[self.grades != 0]
+        touched = old_grades.index.droplevel("Grade").unique()
+        alive = self.grades.index.droplevel("Grade").unique()
+        dead = touched[~touched.isin(alive)]
+        if len(dead):
+            self.cells = self.cells[~self.cells.index.droplevel(SKILL).isin(dead)]
+
+    # --- Slicing ---
+    @staticmethod
+    def _mask(frame, terms=None, student=None):
+        mask = pd.Series(True, index=frame.index)
+        if terms is not None:
+            mask &= frame.index.get_level_values(TERM).isin(list(terms))
+        if student is not None:
+            mask &= frame.index.get_level_values(STUDENT) == student
+        return mask.to_numpy()
+
+    def slice_cells(self, terms=None, student=None):
+        return self.cells[self._mask(self.cells, terms, student)]
+
+    def slice_grades(self, terms=None, student=None):
+        return self.grades[self._mask(self.grades, terms, student)]
+
+    # --- Views used by the dashboard ---
+    def term_skill_means(self, terms=None, student=None):
+        """Mean score per (Term, Skill): columns Term, Skill, Score, Count."""
+        cells = self.slice_cells(terms, student)
+        agg = cells.groupby(level=[TERM, SKILL], observed=True).sum()
+        out = agg.reset_index()
+        out["Score"] = out["sum"] / out["count"].where(out["count"] > 0)
+        return out.rename(columns={"count": "Count"})[[TERM, SKILL, "Score", "Count"]]
+
+    def skill_means(self, terms=None, student=None):
+        """Mean score per skill over the slice (Series indexed by skill)."""
+        cells = self.slice_cells(terms, student)
+        agg = cells.groupby(level=SKILL).sum().reindex(self.skills)
+        return agg["sum"] / agg["count"].where(agg["count"] > 0)
+
+    def student_means(self, terms=None):
+        """Mean score per student over the slice (Series indexed by name)."""
+        cells = self.slice_cells(terms)
+        agg = cells.groupby(level=STUDENT, observed=True).sum()
+        return agg["sum"] / agg["count"].where(agg["count"] > 0)
+
+    def grade_counts(self, terms=None, student=None):
+        """Report count per grade: columns Grade, count."""
+        grades = self.slice_grades(terms, student)
+        return grades.groupby(level="Grade").sum().reset_index()
+
+    def success_rate(self, terms=None, student=None, passing=("A", "B")):
+        counts = self.grade_counts(terms, student)
+        total = counts["count"].sum()
+        if total == 0:
+            return 0.0
+        return counts.loc[counts["Grade"].isin(passing), "count"].sum() / total * 100
+
+
+def add_growth(term_skill, base_term, how="inner"):
+    """Adds Base and Growth (% change against base_term) to a term_skill_means frame."""
+    base = term_skill[term_skill[TERM] == base_term][[SKILL, "Score"]].rename(columns={"Score": "Base"})
+    out = pd.merge(term_skill, base, on=SKILL, how=how)
+    out["Growth"] = ((out["Score"] - out["Base"]) / out["Base"]) * 100
+    return out
+
+
+def _combine(added, removed):
+    return pd.concat([added, -removed]).groupby(level=[0, 1, 2], dropna=False).sum()
+
+
+def _merge_delta(target, delta):
+    # Only the keys present in delta are touched; unseen keys are appended
+    hit = delta.index.isin(target.index)
+    if hit.any():
+        target.loc[delta.index[hit]] += delta[hit]
+    if (~hit).any():
+        target = pd.concat([target, delta[~hit]])
+    return target
+
+
+# =====================================
+# Data-editor edits
+# =====================================
+def diff_edits(master, edits):
+    """Returns (labels, new_values) for master rows that the edits actually change.
+
+    Follows DataFrame.update: rows not in master are ignored and blank edited
+    cells keep the current value.
+    """
+    common = edits.index.intersection(master.index)
+    cols = [c for c in master.columns if c in edits.columns]
+    old = master.loc[common, cols].astype(object)
+    new = edits.loc[common, cols].astype(object)
+    new = new.where(new.notna(), old)
+    same = (old == new) | (old.isna() & new.isna())
+    changed = ~same.all(axis=1).to_numpy()
+    return common[changed], new[changed]
+
+
+def assign_rows(frame, labels, values):
+    """Writes values into frame rows in place, keeping its compact dtypes."""
+    for col in values.columns:
+        vals = values[col]
+        dtype = frame[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            present = pd.Index(vals.dropna().unique())
+            missing = present[~present.isin(dtype.categories)]
+            if len(missing):
+                frame[col] = frame[col].cat.add_categories(list(missing))
+        elif pd.api.types.is_float_dtype(dtype):
+            vals = pd.to_numeric(vals, errors="coerce").astype(dtype)
+        frame.loc[labels, col] = vals.to_numpy()
+
+
+def apply_edits(master, edits):
+    """Applies data-editor edits to master in place; returns the labels of changed rows."""
+    labels, values = diff_edits(master, edits)
+    if len(labels):
+        assign_rows(master, labels, values)
+    return labels
@@ -1,38 +1,71 @@
 # Pulse Reset: Dec 27, 2025 - 11:10 AM
+import argparse
 import os
 import json
 import pandas as pd
 from datetime import datetime, timedelta
-from fpdf import FPDF
 from io import BytesIO
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
 from google.oauth2 import service_account
 import time # Ensure this is imported at the top
-
-# --- Helper: Flatten Logic ---
-def extract_and_flatten(df_raw):
-    rows = []
-    i = 0
-    while i < len(df_raw):
-        cell = str(df_raw.iloc[i, 0])
-        if cell.startswith("Term:"):
-            term = cell.replace("Term:", "").strip()
-            header_row = i + 2
-            if header_row >= len(df_raw): break
-            headers = [str(h).strip() for h in df_raw.iloc[header_row].tolist()]
-            j = header_row + 1
-            while j < len(df_raw) and pd.notna(df_raw.iloc[j, 0]):
-                row = dict(zip(headers, df_raw.iloc[j].tolist()))
-                row["Term"] = term
-                rows.append(row)
-                j += 1
-            i = j
+from data_parser import load_workbook_tables
+from drive_sync import (DriveManifest, RequestScheduler, UploadStats, file_version, is_not_found, resolve_folders,
+                        service_factory, sync_reports, trash_files)
+from grading import add_grades
+from export_cache import RenderCache
+from pdf_reports import ReportTemplate, render_reports
+
+DIGEST_CHARS = 16  # report digest length kept per student in the manifest snapshot
+
+
+def report_name(subject, student_name):
+    return f"{subject}_{student_name}_report.pdf"
+
+
+def removed_rows(previous, snapshots):
+    """[(subject, term, student, digest)] present in the previous snapshot but not in this run.
+
+    Only subjects that still have rows this run are compared, so a sheet that
+    is missing or parses empty never makes all of its students "removed".
+    """
+    removed = []
+    for subject, terms in previous.items():
+        if subject not in snapshots:
+            continue
+        for term, students in terms.items():
+            current = snapshots[subject].get(term, {})
+            removed.extend((subject, term, student, digest)
+                           for student, digest in students.items() if student not in current)
+    return removed
+
+
+def trash_reports(drive_service, root_folder_id, manifest, rows, scheduler):
+    """Trashes the Drive reports of removed rows.
+
+    Returns (number of reports sent to the trash, rows whose report could not be trashed);
+    rows without a known Drive file are only dropped from the snapshot.
+    """
+    targets = {}  # file ID -> (row, folder ID, file name)
+    for row in rows:
+        subject, term, student, _ = row
+        folder_id = manifest.folders.get(manifest.folder_key(root_folder_id, term))
+        name = report_name(subject, student)
+        meta = manifest.files.get(folder_id, {}).get(name)
+        if meta is not None:
+            targets[meta["id"]] = (row, folder_id, name)
+
+    errors = trash_files(drive_service, list(targets), scheduler)
+    failed = []
+    for file_id, (row, folder_id, name) in targets.items():
+        error = errors.get(file_id)
+        if error is not None and not is_not_found(error):
+            failed.append(row)
         else:
-            i += 1
-    return pd.DataFrame(rows)
+            manifest.files[folder_id].pop(name, None)
+    return len(targets), failed
+
 
-def main():
+def main(workers=4, rps=10.0, manifest_path="drive_manifest.json", force=False, trash_removed=False):
     # 1. Check Schedule
     if not os.path.exists("schedule.json"):
         print("❌ No schedule.json found.")
@@ -60,104 +93,161 @@ def main():
         sa_info, scopes=['https://www.googleapis.com/auth/drive']
     )
     drive_service = build('drive', 'v3', credentials=creds)
-
-    # 3. Download data.xlsx
-    request = drive_service.files().get_media(fileId=data_file_id)
-    fh = BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        _, done = downloader.next_chunk()
-    
-    fh.seek(0)
-    xls = pd.ExcelFile(fh, engine='openpyxl')
+    run_upload(drive_service, service_factory(creds), root_folder_id, data_file_id,
+               workers=workers, rps=rps, manifest_path=manifest_path, force=force,
+               trash_removed=trash_removed)
+
+
+def run_upload(drive_service, make_service, root_folder_id, data_file_id, workers=4, rps=10.0,
+               manifest_path="drive_manifest.json", verbose=True, force=False, trash_removed=False):
+    """Steps 3-5 of a scheduled run against any Drive client (load_test.py passes a FakeDrive).
+
+    make_service builds one client per upload worker. Only reports whose row was added or
+    changed since the manifest's snapshot are rendered and uploaded (force: all of them);
+    trash_removed also trashes the reports of students no longer in the workbook.
+    Returns (UploadStats, RequestScheduler).
+    """
+    # Every Drive call below is rate limited and retried on quota / 5xx errors
+    scheduler = RequestScheduler(rate=rps)
     skills = ["Logic", "UI", "Animation", "Teamwork"]
-
-    # 4. Process Every Sheet
-    folder_cache = {}  # This will remember folder IDs so we don't ask Google twice
-
-    for sheet_name in xls.sheet_names:
+    template = ReportTemplate(skills)
+    manifest = DriveManifest(manifest_path)
+    stats = UploadStats()
+
+    # 3. Skip the run if data.xlsx (and the report layout) are unchanged since the last full sync
+    version = dict(file_version(drive_service, data_file_id, scheduler), template=template.version)
+    if not force and manifest.sources.get(data_file_id) == version:
+        print(f"⏭️ data.xlsx unchanged since {version['modifiedTime']}, nothing to do")
+        return stats, scheduler
+
+    # Download data.xlsx (a small file, fetched in one request)
+    fh = BytesIO(scheduler.execute(drive_service.files().get_media(fileId=data_file_id)))
+    # One pass over the workbook: every subject sheet is parsed while the file is open
+    tables = load_workbook_tables(fh, ["Student Name"] + skills)
+
+    # 4. Diff every sheet against the last run's snapshot; only added/changed rows are rendered
+    previous = manifest.snapshots
+    snapshots = {}  # this run: subject -> term -> student -> digest
+    rows = []  # (subject, term, student, digest, job, previous digest) for every parsed row
+    delta = {"added": 0, "changed": 0, "missing": 0, "removed": 0, "unchanged": 0}
+
+    # Optional on-disk cache of rendered reports (only useful if the path persists between runs)
+    render_cache = RenderCache(os.environ["RENDER_CACHE_PATH"]) if os.environ.get("RENDER_CACHE_PATH") else None
+
+    for sheet_name, df in tables.items():
         print(f"📖 Subject: {sheet_name}")
-        df_raw = pd.read_excel(xls, sheet_name=sheet_name, header=None)
-        df = extract_and_flatten(df_raw)
 
         if df.empty: continue
 
         df[skills] = df[skills].apply(pd.to_numeric, errors='coerce').fillna(0)
-        df["Average"] = df[skills].mean(axis=1)
-        
-        def grade(avg):
-            if avg >= 80: return "A"
-            elif avg >= 70: return "B"
-            elif avg >= 60: return "C"
-            elif avg >= 50: return "D"
-            else: return "F"
-
-        df["Grade"] = df["Average"].apply(grade)
-        
-        df["Remarks"] = df["Average"].apply(
-        lambda x: "Excellent work!" if x >= 80 else
-                  "Good effort, keep improving!" if x >= 70 else
-                  "Needs improvement"
-        )
-
-        for _, row in df.iterrows():
-            student_name = str(row['Student Name']).strip()
-            term_clean = str(row['Term']).strip()
-            
-            # --- FOLDER LOGIC with Cache ---
-            if term_clean in folder_cache:
-                term_folder_id = folder_cache[term_clean]
-            else:
-                # Search Google Drive
-                q_folder = f"name='{term_clean}' and mimeType='application/vnd.google-apps.folder' and '{root_folder_id}' in parents and trashed=false"
-                res_folder = drive_service.files().list(q=q_folder, fields="files(id)", supportsAllDrives=True, includeItemsFromAllDrives=True).execute()
-                folders = res_folder.get('files', [])
-                
-                if folders:
-                    term_folder_id = folders[0]['id']
-                    print(f"📂 Found existing folder: {term_clean}")
-                else:
-                    print(f"📁 Creating new folder: {term_clean}")
-                    new_folder = drive_service.files().create(
-                        body={'name': term_clean, 'mimeType': 'application/vnd.google-apps.folder', 'parents': [root_folder_id]},
-                        fields='id', supportsAllDrives=True).execute()
-                    term_folder_id = new_folder.get('id')
-                
-                # Save to cache so we don't search/create for this term again in this run
-                folder_cache[term_clean] = term_folder_id
-
-            # --- FILE LOGIC ---
-            file_name = f"{sheet_name}_{student_name}_report.pdf"
-            
-            # PDF Generation
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Arial", "B", 16)
-            pdf.cell(0, 10, f"{sheet_name} - {student_name}", ln=True, align='C')
-            pdf.cell(0, 10, f"Progress Report ({term_clean})", ln=True, align='C')
-            pdf.ln(10)
-            pdf.set_font("Arial", "", 12)
-            for s in skills:
-                pdf.cell(0, 8, f"{s}: {int(row[s])}", ln=True)
-            pdf.cell(0, 8, f"Average: {row['Average']:.2f}", ln=True)
-            pdf.cell(0, 8, f"Grade: {row['Grade']}", ln=True)
-            pdf.cell(0, 8, f"Remarks: {row['Remarks']}", ln=True)
-
-            pdf_bytes = BytesIO(pdf.output(dest="S").encode("latin-1"))
-            media = MediaIoBaseUpload(pdf_bytes, mimetype='application/pdf')
-
-            # --- OVERWRITE CHECK ---
-            q_file = f"name='{file_name}' and '{term_folder_id}' in parents and trashed=false"
-            res_file = drive_service.files().list(q=q_file, fields="files(id)", supportsAllDrives=True, includeItemsFromAllDrives=True).execute()
-            files = res_file.get('files', [])
-
-            if files:
-                drive_service.files().update(fileId=files[0]['id'], media_body=media, supportsAllDrives=True).execute()
-                print(f"✅ Overwritten: {file_name}")
+        add_grades(df, skills)
+
+        old = previous.get(sheet_name, {})
+        current = snapshots.setdefault(sheet_name, {})
+        for r in df.to_dict("records"):
+            student_name = str(r['Student Name']).strip()
+            term_clean = str(r['Term']).strip()
+            job = template.job(r, f"Progress Report ({sheet_name}_{str(r['Term']).strip()})")
+            # The cache key covers every rendered value and the template version
+            digest = template.cache_key(job)[:DIGEST_CHARS]
+            current.setdefault(term_clean, {})[student_name] = digest
+            rows.append((sheet_name, term_clean, student_name, digest, job, old.get(term_clean, {}).get(student_name)))
+
+    # Term folders are resolved (and re-listed when due) before the diff: an unchanged row is
+    # only skipped if its report is still in its folder, so deleted reports are uploaded again
+    folder_ids, _ = resolve_folders(drive_service, root_folder_id, list(dict.fromkeys(row[1] for row in rows)),
+                                    manifest, scheduler)
+    todo = []  # indexes into rows
+    for i, (sheet_name, term_clean, student_name, digest, _, before) in enumerate(rows):
+        in_drive = report_name(sheet_name, student_name) in manifest.files.get(folder_ids.get(term_clean), {})
+        if before == digest and in_drive:
+            delta["unchanged"] += 1
+            if not force:
+                continue
+        elif before == digest:
+            delta["missing"] += 1
+        else:
+            delta["changed" if before else "added"] += 1
+        todo.append(i)
+
+    removed = removed_rows(previous, snapshots)
+    delta["removed"] = len(removed)
+    # Subjects that are missing or parse empty keep their last snapshot (never treated as removed)
+    for subject in previous.keys() - snapshots.keys():
+        print(f"⚠️ Subject {subject} has no rows this run; keeping its previous reports")
+        snapshots[subject] = previous[subject]
+    print("🔍 Delta: " + " · ".join(f"{count} {kind}" for kind, count in delta.items()))
+
+    # 5. Sync to Drive: folder/file IDs come from the manifest when known, uploads run on a
+    #    pool of workers, and a PDF is only sent if its MD5 differs from Drive's copy
+    def sync(indexes):
+        pdfs = render_reports(template, [rows[i][4] for i in indexes], cache=render_cache)
+        reports = [(rows[i][1], report_name(rows[i][0], rows[i][2]), pdf) for i, pdf in zip(indexes, pdfs)]
+        print(f"🚀 Uploading {len(reports)} reports with {workers} workers")
+        outcomes, errors = sync_reports(drive_service, make_service, root_folder_id, reports,
+                                        workers=workers, scheduler=scheduler, manifest=manifest)
+        return [(i, outcome, errors.get(j)) for j, (i, outcome) in enumerate(zip(indexes, outcomes))]
+
+    results = sync(todo)
+    # A term folder that was gone (404) has been recreated by sync_reports: its unchanged
+    # reports went with the old folder, so they are uploaded again as well
+    recreated = {term for term, folder_id in folder_ids.items()
+                 if manifest.folders.get(manifest.folder_key(root_folder_id, term)) != folder_id}
+    if recreated:
+        queued = set(todo)
+        again = [i for i, row in enumerate(rows) if row[1] in recreated and i not in queued]
+        print(f"♻️ Recreated term folders {sorted(recreated)}: re-uploading {len(again)} unchanged reports")
+        results += sync(again)
+
+    labels = {"created": "🆕 Created", "updated": "✅ Overwritten", "skipped": "⏭️ Unchanged", "failed": "❌ Failed"}
+    for i, outcome, error in results:
+        sheet_name, term_clean, student_name, _, _, before = rows[i]
+        stats.add(outcome)
+        if verbose or outcome == "failed":
+            print(f"{labels[outcome]}: {report_name(sheet_name, student_name)}" + (f" ({error})" if error else ""))
+        if outcome == "failed":
+            # Keep the old digest (or none), so the row is retried on the next run
+            terms = snapshots[sheet_name][term_clean]
+            if before is None:
+                terms.pop(student_name, None)
             else:
-                drive_service.files().create(body={'name': file_name, 'parents': [term_folder_id]}, media_body=media, supportsAllDrives=True).execute()
-                print(f"🆕 Created: {file_name}")
-                    
+                terms[student_name] = before
+
+    # Removed students: trash their reports (opt-in), or just drop them from the snapshot
+    trash_failed = []
+    if trash_removed and removed:
+        sent, trash_failed = trash_reports(drive_service, root_folder_id, manifest, removed, scheduler)
+        print(f"🗑️ Trashed {sent - len(trash_failed)} reports of removed students"
+              + (f" ({len(trash_failed)} failed)" if trash_failed else "")
+              + (f", {len(removed) - sent} had no known Drive file" if len(removed) > sent else ""))
+    for sheet_name, term_clean, student_name, digest in trash_failed:
+        snapshots.setdefault(sheet_name, {}).setdefault(term_clean, {})[student_name] = digest
+
+    print(f"📊 Upload summary: {stats.summary()}")
+    print(f"📊 Drive API: {scheduler.summary()}")
+
+    manifest.snapshots = {subject: {term: students for term, students in terms.items() if students}
+                          for subject, terms in snapshots.items()}
+    # Only a fully successful run marks this version as done; failures (and runs that had to
+    # recreate a folder) are retried next tick
+    if not stats.failed and not trash_failed and not recreated:
+        manifest.sources[data_file_id] = version
+    manifest.save()
+    return stats, scheduler
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scheduled report generation and Google Drive upload")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("UPLOAD_WORKERS", 4)),
+                        help="parallel Drive uploads (default: $UPLOAD_WORKERS or 4)")
+    parser.add_argument("--rps", type=float, default=float(os.environ.get("DRIVE_RPS", 10)),
+                        help="Drive requests per second (default: $DRIVE_RPS or 10)")
+    parser.add_argument("--manifest", default=os.environ.get("DRIVE_MANIFEST_PATH", "drive_manifest.json"),
+                        help="JSON file remembering Drive folder/file IDs between runs")
+    parser.add_argument("--force", action="store_true",
+                        help="regenerate and sync every report, even if data.xlsx is unchanged since the last run")
+    parser.add_argument("--trash-removed", action="store_true", default=os.environ.get("TRASH_REMOVED_REPORTS") == "1",
+                        help="trash the reports of students removed from data.xlsx (default: $TRASH_REMOVED_REPORTS=1)")
+    args = parser.parse_args()
+    main(workers=args.workers, rps=args.rps, manifest_path=args.manifest, force=args.force,
+         trash_removed=args.trash_removed)
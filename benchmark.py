@@ -0,0 +1,254 @@
+# Quick performance checks for the data pipeline.
+# Usage: python benchmark.py [rows]
+import os
+import sys
+import tempfile
+import time
+import random
+import re
+import zipfile
+from io import BytesIO
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.styles import Font
+
+from data_parser import flatten_rows, load_workbook_tables, normalize_table
+from grading import add_grades
+from validation import audit_table
+from excel_export import save_to_stacked_format
+from export_cache import RenderCache
+from fpdf import FPDF
+from pdf_reports import ReportTemplate, render_reports
+
+SKILLS = ["Logic", "UI", "Animation", "Teamwork"]
+TERMS = ["Jan", "Feb", "March", "Apr", "May", "June", "July", "August", "Sept", "Oct", "Nov", "Dec"]
+
+
+# --- Reference: the original row-by-row parser ---
+def legacy_extract_and_flatten(df_raw):
+    rows = []
+    i = 0
+    while i < len(df_raw):
+        cell = str(df_raw.iloc[i, 0])
+        if cell.startswith("Term:"):
+            term = cell.replace("Term:", "").strip()
+            header_row = i + 2
+            if header_row >= len(df_raw): break
+            headers = [str(h).strip() for h in df_raw.iloc[header_row].tolist()]
+            j = header_row + 1
+            while j < len(df_raw) and pd.notna(df_raw.iloc[j, 0]):
+                row = dict(zip(headers, df_raw.iloc[j].tolist()))
+                row["Term"] = term
+                rows.append(row)
+                j += 1
+            i = j
+        else:
+            i += 1
+    return pd.DataFrame(rows)
+
+
+def make_raw_sheet(n_rows, n_terms=12, seed=0):
+    """Builds a raw (header=None) sheet in the stacked Term layout with ~n_rows students."""
+    rng = random.Random(seed)
+    per_term = max(1, n_rows // n_terms)
+    grid = []
+    for t in range(n_terms):
+        grid.append([f"Term: {TERMS[t % len(TERMS)]}"] + [None] * len(SKILLS))
+        grid.append(["--------------------------"] + [None] * len(SKILLS))
+        grid.append(["Student Name"] + SKILLS)
+        for s in range(per_term):
+            scores = [rng.choice([rng.randint(0, 100), None]) if rng.random() < 0.05 else rng.randint(0, 100)
+                      for _ in SKILLS]
+            grid.append([f"Student {s}"] + scores)
+        grid.append([None] * (len(SKILLS) + 1))
+        grid.append([None] * (len(SKILLS) + 1))
+    return pd.DataFrame(grid, dtype=object)
+
+
+def flat_table(df_raw):
+    """The raw grid through the production state machine (as load_workbook_tables feeds it)."""
+    return flatten_rows(df_raw.itertuples(index=False, name=None), ["Student Name"] + SKILLS)
+
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def _stale_dimension(xlsx_bytes, ref="A1:C3"):
+    # Rewrites every <dimension ref> tag, as some writers leave it out of date
+    out = BytesIO()
+    with zipfile.ZipFile(BytesIO(xlsx_bytes)) as zin, zipfile.ZipFile(out, "w") as zout:
+        for item in zin.infolist():
+            data = zin.read(item)
+            if item.filename.startswith("xl/worksheets/"):
+                data = re.sub(rb'<dimension ref="[^"]*"', f'<dimension ref="{ref}"'.encode(), data)
+            zout.writestr(item, data)
+    return out.getvalue()
+
+
+def check_streaming_parity(df_raw):
+    """load_workbook_tables (openpyxl read-only) must match pd.read_excel + the legacy parser."""
+    buf = BytesIO()
+    df_raw.to_excel(buf, sheet_name="Math", header=False, index=False)
+    columns = ["Student Name"] + SKILLS
+    expected = normalize_table(legacy_extract_and_flatten(pd.read_excel(BytesIO(buf.getvalue()), header=None)), TERMS)
+    for data in (buf.getvalue(), _stale_dimension(buf.getvalue())):
+        got = load_workbook_tables(BytesIO(data), columns, TERMS)["Math"]
+        pd.testing.assert_frame_equal(got[expected.columns], expected, check_like=True)
+
+
+def bench_parser(n_rows):
+    # flatten_rows is the production parser (it replaced the vectorized block-ID
+    # parser); it is timed here on an in-memory grid, without openpyxl's read cost
+    df_raw = make_raw_sheet(n_rows)
+    t_old, old = timed(legacy_extract_and_flatten, df_raw, repeat=1)
+    t_new, new = timed(flat_table, df_raw)
+    pd.testing.assert_frame_equal(old, new)
+    check_streaming_parity(make_raw_sheet(min(n_rows, 2000)))
+    print(f"flatten_rows         rows={len(df_raw):>7}  legacy={t_old*1000:9.1f} ms  "
+          f"streaming={t_new*1000:9.1f} ms  speedup={t_old/t_new:6.1f}x")
+
+
+def bench_dtypes(n_rows):
+    flat = flat_table(make_raw_sheet(n_rows))
+    before = flat.memory_usage(deep=True).sum()
+    after = normalize_table(flat, TERMS).memory_usage(deep=True).sum()
+    print(f"normalize_table      rows={len(flat):>7}  before={before/1024:9.1f} KiB  "
+          f"after={after/1024:8.1f} KiB  saved={100*(1-after/before):5.1f}%")
+
+
+def legacy_grades(df):
+    df = df.copy()
+    df["Average"] = df[SKILLS].mean(axis=1)
+    df["Grade"] = df["Average"].apply(lambda x: "A" if x>=80 else "B" if x>=70 else "C" if x>=60 else "D" if x>=50 else "F")
+    df["Remarks"] = df["Average"].apply(
+        lambda x: "Excellent work!" if x >= 80 else "Good effort, keep improving!" if x >= 70 else "Needs improvement")
+    return df
+
+
+def bench_grading(n_rows=100_000):
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 101, size=(n_rows, len(SKILLS))).astype("float32")
+    scores[rng.random(scores.shape) < 0.02] = np.nan
+    df = pd.DataFrame(scores, columns=SKILLS)
+    t_old, old = timed(legacy_grades, df)
+    t_new, new = timed(lambda d: add_grades(d.copy(), SKILLS), df)
+    assert (old["Grade"].tolist() == new["Grade"].tolist()) and (old["Remarks"].tolist() == new["Remarks"].tolist())
+    print(f"add_grades           rows={n_rows:>7}  legacy={t_old*1000:9.1f} ms  "
+          f"vectorized={t_new*1000:8.1f} ms  speedup={t_old/t_new:6.1f}x")
+
+
+def bench_audit(n_rows):
+    df = normalize_table(flat_table(make_raw_sheet(n_rows)), TERMS)
+    t_old, old = timed(lambda d: d.apply(lambda r: "🚨 MISSING" if r[SKILLS].isnull().any() else "✅ OK", axis=1), df, repeat=1)
+    t_new, flags = timed(lambda d: audit_table(d, SKILLS, d.attrs.get("non_numeric")), df)
+    assert (old == "🚨 MISSING").tolist() == flags["missing"].tolist()
+    print(f"audit_table          rows={len(df):>7}  legacy={t_old*1000:9.1f} ms  "
+          f"vectorized={t_new*1000:8.1f} ms  speedup={t_old/t_new:6.1f}x")
+
+
+# --- Reference: the original cell-by-cell openpyxl writer ---
+def legacy_save_to_stacked_format(df_to_save, sheet_name, skill_cols):
+    output = BytesIO()
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = sheet_name
+    current_row = 1
+    terms = sorted(df_to_save["Term"].unique(), key=lambda x: TERMS.index(x) if x in TERMS else 99)
+    for term in terms:
+        ws.cell(row=current_row, column=1, value=f"Term: {term}").font = Font(bold=True)
+        current_row += 1
+        ws.cell(row=current_row, column=1, value="--------------------------")
+        current_row += 1
+        headers = ["Student Name"] + skill_cols
+        for col_num, header in enumerate(headers, 1):
+            ws.cell(row=current_row, column=col_num, value=header).font = Font(bold=True)
+        current_row += 1
+        term_data = df_to_save[df_to_save["Term"] == term]
+        for _, row in term_data.iterrows():
+            ws.cell(row=current_row, column=1, value=row["Student Name"])
+            for col_num, skill in enumerate(skill_cols, 2):
+                ws.cell(row=current_row, column=col_num, value=row[skill])
+            current_row += 1
+        current_row += 2
+    wb.save(output)
+    return output.getvalue()
+
+
+def bench_export(n_rows):
+    df = normalize_table(flat_table(make_raw_sheet(n_rows)), TERMS)
+    t_old, _ = timed(legacy_save_to_stacked_format, df, "Math", SKILLS, repeat=1)
+    t_new, _ = timed(save_to_stacked_format, df, "Math", SKILLS)
+    print(f"save_to_stacked      rows={len(df):>7}  legacy={t_old*1000:9.1f} ms  "
+          f"streaming={t_new*1000:9.1f} ms  speedup={t_old/t_new:6.1f}x")
+
+
+# --- Reference: one FPDF document per student (the original report code) ---
+def legacy_report_pdf(r, title):
+    pdf = FPDF()
+    pdf.add_page()
+    try:
+        pdf.image("logo.png", x=100, y=8, w=33)
+    except:
+        pdf.set_font("Arial", "I", 8)
+        pdf.cell(0, 5, "[School Logo Placeholder]", ln=True)
+    pdf.ln(20)
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, title, ln=True)
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(0, 8, f"Student: {str(r['Student Name']).strip()}", ln=True)
+    pdf.cell(0, 5, "-"*30, ln=True)
+    for s in SKILLS:
+        score = r[s] if pd.notna(r[s]) else 0
+        pdf.cell(0, 8, f"{s}: {score}", ln=True)
+    pdf.cell(0, 5, "-"*30, ln=True)
+    pdf.cell(0, 8, f"Average: {r['Average']:.2f}", ln=True)
+    pdf.cell(0, 8, f"Grade: {r['Grade']}", ln=True)
+    pdf.cell(0, 8, f"Remarks: {r['Remarks']}", ln=True)
+    return pdf.output(dest="S").encode("latin-1")
+
+
+def bench_pdf(n_reports=10_000, legacy_sample=1_000):
+    df = add_grades(normalize_table(flat_table(make_raw_sheet(n_reports))), SKILLS)
+    records = df.to_dict("records")
+    sample = records[:legacy_sample]
+    # FPDF is timed on a sample (it is linear in the number of reports)
+    t_old, _ = timed(lambda rs: [legacy_report_pdf(r, f"Progress Report ({r['Term']})") for r in rs], sample, repeat=1)
+    template = ReportTemplate(SKILLS)
+    t_new, _ = timed(lambda rs: [template.render_row(r, f"Progress Report ({r['Term']})") for r in rs], records)
+    per_old, per_new = t_old / len(sample) * 1000, t_new / len(records) * 1000
+    print(f"report PDFs          rows={len(records):>7}  fpdf={per_old:9.3f} ms/report  "
+          f"template={per_new:6.3f} ms/report  speedup={per_old/per_new:6.1f}x")
+
+    workers = max(2, os.cpu_count() or 1)
+    jobs = [template.job(r, f"Progress Report ({r['Term']})") for r in records]
+    # min_jobs=0 forces the pool, to measure its overhead against in-process stamping
+    t_pool, _ = timed(lambda js: list(render_reports(template, js, workers=workers, min_jobs=0)), jobs, repeat=1)
+    print(f"render_reports       rows={len(records):>7}  workers={workers:>2}  "
+          f"pool={t_pool*1000:9.1f} ms  ({t_pool / len(records) * 1000:.3f} ms/report)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RenderCache(os.path.join(tmp, "renders.sqlite"))
+        t_cold, first = timed(lambda js: list(render_reports(template, js, cache=cache)), jobs, repeat=1)
+        t_warm, second = timed(lambda js: list(render_reports(template, js, cache=cache)), jobs)
+        cache.close()
+    assert first == second  # deterministic bytes
+    print(f"render cache         rows={len(records):>7}  cold={t_cold*1000:9.1f} ms  warm={t_warm*1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 12000
+    bench_parser(n)
+    bench_dtypes(n)
+    bench_grading()
+    bench_audit(n)
+    bench_export(n)
+    bench_pdf()
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+import openpyxl
+
+# =====================================
+# Data Parsing Engine (shared by the app and the scheduler)
+# =====================================
+# Sheet layout, repeated once per term:
+#   Term: Jan
+#   --------------------------
+#   Student Name | Logic | UI | ...
+#   Alice        | 80    | 75 | ...
+#   (blank row ends the block)
+# Sheets are streamed through openpyxl read-only mode; no raw DataFrame is built.
+# flatten_rows' per-row state machine supersedes the earlier vectorized block-ID
+# parser over a raw DataFrame: it needs no raw sheet in memory, it records every
+# row's source cell for write-back, and it is ~5% of a parse (openpyxl's XML
+# reading is the rest), so vectorizing it again would not be measurable.
+
+def _clean_cell(value):
+    # Same conversions pd.read_excel applies: blanks -> NaN, whole floats -> int
+    if value is None or value == "":
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+class CellPositions:
+    """Where every parsed row sits in its sheet, for writing edits back in place.
+
+    Row labels are the 0-based positions of the freshly parsed table. The
+    object is immutable and shared: pandas copies attrs on most operations,
+    so deepcopy returns the same instance.
+    """
+
+    def __init__(self, rows, blocks, block_columns):
+        self.rows = np.asarray(rows, dtype="int32")      # 1-based sheet row per table row
+        self.blocks = np.asarray(blocks, dtype="int32")  # term block per table row
+        self.block_columns = block_columns               # per block: {column name: 0-based column}
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def cell(self, label, column):
+        """(1-based row, 1-based column) of a table cell, or None if it has no source cell."""
+        if not 0 <= label < len(self.rows):
+            return None
+        col = self.block_columns[self.blocks[label]].get(column)
+        if col is None:
+            return None
+        return int(self.rows[label]), col + 1
+
+
+def flatten_rows(rows, keep_columns):
+    """Runs the Term/header/data state machine over streamed row tuples.
+
+    Only the columns named in keep_columns (plus Term) are kept, so memory
+    follows the size of the output rather than the size of the sheet.
+    Where each student came from is kept in attrs["cell_positions"].
+    """
+    columns = {name: [] for name in keep_columns}
+    terms = []
+    seen = []
+    source_rows, source_blocks, block_columns = [], [], []
+
+    state, term, col_index = "scan", None, {}
+    for row_number, row in enumerate(rows, start=1):
+        first = row[0] if row else None
+
+        if state == "data":
+            if first is None or first == "":
+                state = "scan"
+                continue
+            for name in keep_columns:
+                k = col_index.get(name)
+                columns[name].append(_clean_cell(row[k]) if k is not None and k < len(row) else np.nan)
+            terms.append(term)
+            source_rows.append(row_number)
+            source_blocks.append(len(block_columns) - 1)
+        elif state == "dotted":
+            state = "header"
+        elif state == "header":
+            headers = [str(h).strip() for h in row]
+            col_index = {h: k for k, h in enumerate(headers) if h in columns}
+            seen.extend(h for h in col_index if h not in seen)
+            block_columns.append(col_index)
+            state = "data"
+        elif isinstance(first, str) and first.startswith("Term:"):
+            term = first.replace("Term:", "").strip()
+            state = "dotted"
+
+    if not terms:
+        return pd.DataFrame()
+    kept = [name for name in keep_columns if name in seen]
+    out = pd.DataFrame({name: columns[name] for name in kept})
+    out["Term"] = terms
+    out.attrs["cell_positions"] = CellPositions(source_rows, source_blocks, block_columns)
+    return out
+
+
+def _sheet_rows(ws):
+    # Read-only sheets stop at the <dimension ref> tag, which can be stale; ignore it (as pandas does)
+    ws.reset_dimensions()
+    return ws.iter_rows(values_only=True)
+
+
+def load_workbook_tables(source, keep_columns, term_order=None):
+    """Parses every sheet in one pass over the xlsx and returns {sheet_name: flattened table}.
+
+    Tables are passed through normalize_table, so Term is an ordered
+    categorical (term_order first) and the scores are float32.
+    """
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        return {name: normalize_table(flatten_rows(_sheet_rows(wb[name]), keep_columns), term_order)
+                for name in wb.sheetnames}
+    finally:
+        wb.close()
+
+
+# =====================================
+# Compact dtypes
+# =====================================
+def normalize_table(df, term_order=None):
+    """Converts a flattened table to compact columnar dtypes.
+
+    Term -> ordered categorical (term_order, then any other terms in order of
+    appearance), Student Name -> categorical, every other column -> float32
+    scores (non-numeric cells become NaN, as pd.to_numeric(errors='coerce')).
+    The row labels of coerced cells are kept in attrs["non_numeric"] so the
+    audit can still report them.
+    """
+    if df.empty:
+        return df
+
+    out = df.copy()
+    non_numeric = {}
+    for col in out.columns:
+        if col not in ("Term", "Student Name"):
+            scores = pd.to_numeric(out[col], errors="coerce")
+            coerced = scores.isna() & out[col].notna()
+            if coerced.any():
+                non_numeric[col] = out.index[coerced.to_numpy()].tolist()
+            out[col] = scores.astype("float32")
+    out.attrs["non_numeric"] = non_numeric
+
+    if "Student Name" in out.columns:
+        out["Student Name"] = out["Student Name"].astype("category")
+
+    if "Term" in out.columns:
+        terms = out["Term"].astype(object)
+        known = list(term_order or [])
+        extra = [t for t in pd.unique(terms.dropna()) if t not in known]
+        out["Term"] = pd.Categorical(terms, categories=known + extra, ordered=True)
+    return out
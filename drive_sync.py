@@ -0,0 +1,522 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import socket
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+
+# =====================================
+# Google Drive report sync (shared by the app and the scheduler)
+# =====================================
+FOLDER_MIME = "application/vnd.google-apps.folder"
+PDF_MIME = "application/pdf"
+BATCH_LIMIT = 100  # Drive accepts at most 100 calls per batch request
+# errors[].reason of Drive's quota 403s, and the newer ErrorInfo reason sent alongside them
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "RATE_LIMIT_EXCEEDED"}
+
+
+def md5_hex(data):
+    """Same digest Drive reports as md5Checksum for uploaded content."""
+    return hashlib.md5(data).hexdigest()
+
+
+def _quote(value):
+    # Drive query strings are single-quoted; backslash and quote must be escaped
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+class UploadStats:
+    """Outcome counts for one upload run."""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def add(self, outcome):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def summary(self):
+        text = f"🆕 {self.created} created · ✅ {self.updated} updated · ⏭️ {self.skipped} unchanged"
+        return text + (f" · ❌ {self.failed} failed" if self.failed else "")
+
+
+# =====================================
+# Request scheduler (rate limit + retries)
+# =====================================
+def _error_reasons(error):
+    # Read the body ourselves: HttpError.error_details prefers error.details (ErrorInfo)
+    # over error.errors, and quota 403s now carry both
+    try:
+        body = json.loads(error.content.decode("utf-8") if isinstance(error.content, bytes) else error.content)
+        items = body["error"].get("errors", []) + body["error"].get("details", [])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return set()
+    return {item.get("reason") for item in items if isinstance(item, dict)}
+
+
+def is_retryable(error):
+    """True for Drive errors worth retrying: 429, 5xx, rate-limit 403s and dropped connections."""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 429 or status >= 500:
+            return True
+        if status == 403:
+            return bool(_error_reasons(error) & RATE_LIMIT_REASONS)
+        return False
+    return isinstance(error, (ConnectionError, socket.timeout, TimeoutError, httplib2.ServerNotFoundError))
+
+
+class RequestScheduler:
+    """Every Drive call of a run goes through one of these.
+
+    A token bucket keeps the run under rate requests per second (a batch
+    costs one token per call inside it), and retryable errors are retried
+    with jittered exponential backoff. Thread-safe, so the upload workers
+    share it. Counters: requests, retries, throttle_waits and
+    throttle_seconds (time spent waiting for tokens).
+    """
+
+    def __init__(self, rate=10.0, burst=None, max_retries=6, base_delay=1.0, max_delay=64.0):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttle_waits = 0
+        self.throttle_seconds = 0.0
+
+    def _acquire(self, cost):
+        # Tokens may go negative: the caller then sleeps until its share is refilled
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= cost
+            self.requests += cost
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if wait:
+                self.throttle_waits += 1
+                self.throttle_seconds += wait
+        if wait:
+            time.sleep(wait)
+
+    def backoff(self, attempt):
+        """Sleeps before retry number attempt (0-based): full jitter up to base * 2**attempt."""
+        with self._lock:
+            self.retries += 1
+        time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def call(self, fn, cost=1):
+        """Runs fn() under the rate limit, retrying retryable errors."""
+        for attempt in range(self.max_retries + 1):
+            self._acquire(cost)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+            self.backoff(attempt)
+
+    def execute(self, request, cost=1):
+        return self.call(request.execute, cost)
+
+    def summary(self):
+        return (f"📡 {self.requests} API calls · 🔁 {self.retries} retries · "
+                f"⏳ {self.throttle_waits} throttle waits ({self.throttle_seconds:.1f}s)")
+
+
+def is_not_found(error):
+    return isinstance(error, HttpError) and error.resp.status == 404
+
+
+def _execute(request, scheduler):
+    return scheduler.execute(request) if scheduler is not None else request.execute()
+
+
+# =====================================
+# Batched metadata calls
+# =====================================
+def execute_batch(service, requests, scheduler=None):
+    """Runs {key: request} as Drive batch requests of up to BATCH_LIMIT calls.
+
+    Returns ({key: response}, {key: exception}); one failing call does not
+    affect the others in its batch. With a scheduler, calls that failed with
+    a retryable error are sent again in a later batch after a backoff.
+    """
+    results, errors = {}, {}
+    pending = dict(requests)
+    attempts = scheduler.max_retries if scheduler is not None else 0
+    for attempt in range(attempts + 1):
+        failed = {}
+        items = list(pending.items())
+        for start in range(0, len(items), BATCH_LIMIT):
+            chunk = dict(items[start:start + BATCH_LIMIT])
+            keys = list(chunk)
+
+            def collect(request_id, response, exception):
+                key = keys[int(request_id)]
+                if exception is not None:
+                    failed[key] = exception
+                else:
+                    results[key] = response
+
+            batch = service.new_batch_http_request(callback=collect)
+            for i, key in enumerate(keys):
+                batch.add(chunk[key], request_id=str(i))
+            if scheduler is not None:
+                scheduler.execute(batch, cost=len(keys))
+            else:
+                batch.execute()
+
+        retry = {key: err for key, err in failed.items() if is_retryable(err)}
+        errors.update({key: err for key, err in failed.items() if key not in retry})
+        if not retry or attempt == attempts:
+            errors.update(retry)
+            break
+        scheduler.backoff(attempt)
+        pending = {key: pending[key] for key in retry}
+    return results, errors
+
+
+def ensure_folders(service, parent_id, names, scheduler=None):
+    """({name: folder ID}, {name: error}) for term folders directly under parent_id.
+
+    All searches go out as one batch, then all missing folders are created
+    in a second one.
+    """
+    names = list(dict.fromkeys(names))
+    searches = {
+        name: service.files().list(
+            q=f"name={_quote(name)} and mimeType='{FOLDER_MIME}' and {_quote(parent_id)} in parents and trashed=false",
+            fields="files(id)", supportsAllDrives=True, includeItemsFromAllDrives=True,
+        )
+        for name in names
+    }
+    found, errors = execute_batch(service, searches, scheduler)
+    folder_ids = {name: res["files"][0]["id"] for name, res in found.items() if res.get("files")}
+
+    creates = {
+        name: service.files().create(
+            body={"name": name, "mimeType": FOLDER_MIME, "parents": [parent_id]}, fields="id", supportsAllDrives=True
+        )
+        for name in names if name not in folder_ids and name not in errors
+    }
+    created, create_errors = execute_batch(service, creates, scheduler)
+    folder_ids.update({name: res["id"] for name, res in created.items()})
+    errors.update(create_errors)
+    return folder_ids, errors
+
+
+def update_metadata(service, changes, scheduler=None):
+    """Applies {file ID: metadata body} (renames, trashing...) in batches; returns the errors by file ID."""
+    requests = {
+        file_id: service.files().update(fileId=file_id, body=body, fields="id", supportsAllDrives=True)
+        for file_id, body in changes.items()
+    }
+    return execute_batch(service, requests, scheduler)[1]
+
+
+def trash_files(service, file_ids, scheduler=None):
+    """Moves the given files to the trash in batches; returns the errors by file ID."""
+    return update_metadata(service, {file_id: {"trashed": True} for file_id in file_ids}, scheduler)
+
+
+# =====================================
+# Folder listings and uploads
+# =====================================
+def list_folder(service, folder_id, scheduler=None):
+    """{name: {"id", "name", "md5Checksum"}} of every file directly in folder_id.
+
+    One paginated listing per folder replaces a files.list query per report.
+    When names repeat, the first file listed wins (as the old per-name query did).
+    """
+    index = {}
+    page_token = None
+    while True:
+        page = _execute(service.files().list(
+            q=f"{_quote(folder_id)} in parents and trashed=false",
+            fields="nextPageToken, files(id, name, md5Checksum)", pageSize=1000, pageToken=page_token,
+            supportsAllDrives=True, includeItemsFromAllDrives=True,
+        ), scheduler)
+        for meta in page.get("files", []):
+            index.setdefault(meta["name"], meta)
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            return index
+
+
+def file_version(service, file_id, scheduler=None):
+    """{"md5Checksum", "modifiedTime"} of a file: one metadata call, no download."""
+    meta = _execute(service.files().get(
+        fileId=file_id, fields="md5Checksum, modifiedTime", supportsAllDrives=True,
+    ), scheduler)
+    return {"md5Checksum": meta.get("md5Checksum"), "modifiedTime": meta.get("modifiedTime")}
+
+
+def upload_report(service, folder_id, file_name, data, index, resumable=False, scheduler=None):
+    """Creates or overwrites file_name in folder_id with data (PDF bytes).
+
+    index is the folder's list_folder() result: the existence check is a
+    dictionary lookup, and a file whose md5Checksum equals the local MD5 is
+    not uploaded again. index is kept up to date. Returns "created",
+    "updated" or "skipped".
+    """
+    existing = index.get(file_name)
+    digest = md5_hex(data)
+    if existing and existing.get("md5Checksum") == digest:
+        return "skipped"
+
+    media = MediaIoBaseUpload(BytesIO(data), mimetype=PDF_MIME, resumable=resumable)
+    if existing:
+        try:
+            _execute(service.files().update(fileId=existing["id"], media_body=media, supportsAllDrives=True), scheduler)
+            existing["md5Checksum"] = digest
+            return "updated"
+        except HttpError as e:
+            # Deleted since the index was built (e.g. a stale manifest entry): create it again
+            if not is_not_found(e):
+                raise
+            index.pop(file_name, None)
+            media = MediaIoBaseUpload(BytesIO(data), mimetype=PDF_MIME, resumable=resumable)
+    created = _execute(service.files().create(
+        body={"name": file_name, "parents": [folder_id]}, media_body=media, fields="id", supportsAllDrives=True
+    ), scheduler)
+    index[file_name] = {"id": created["id"], "name": file_name, "md5Checksum": digest}
+    return "created"
+
+
+# =====================================
+# Concurrent uploads
+# =====================================
+def service_factory(credentials):
+    """Returns a function that builds a Drive client with its own authorized HTTP.
+
+    httplib2 connections are not thread-safe, so every upload worker calls
+    this once instead of sharing the main thread's client.
+    """
+    def make_service():
+        return build("drive", "v3", http=AuthorizedHttp(credentials, http=httplib2.Http()), cache_discovery=False)
+    return make_service
+
+
+def upload_reports(make_service, jobs, workers=4, resumable=False, progress=None, scheduler=None):
+    """Uploads (folder ID, file name, PDF bytes, folder index) jobs on a pool of threads.
+
+    Workers take jobs from a shared queue, each with its own client from
+    make_service(). Returns (outcomes, errors): outcomes[i] is the
+    upload_report() result of jobs[i] or "failed", errors maps the index of a
+    failed job to its exception. progress(done, total) is called on the
+    calling thread (safe for Streamlit). If the same file appears twice, only
+    its last version is uploaded and the earlier ones count as skipped.
+    """
+    outcomes = ["skipped"] * len(jobs)
+    errors = {}
+    last = {(folder_id, name): i for i, (folder_id, name, _, _) in enumerate(jobs)}
+    todo = queue.Queue()
+    for i in sorted(last.values()):
+        todo.put(i)
+    finished = queue.Queue()
+    total = todo.qsize()
+
+    def work():
+        try:
+            service = make_service()
+        except Exception as e:
+            service, setup_error = None, e
+        while True:
+            try:
+                i = todo.get_nowait()
+            except queue.Empty:
+                return
+            if service is None:
+                finished.put((i, "failed", setup_error))
+                continue
+            folder_id, name, data, index = jobs[i]
+            try:
+                finished.put((i, upload_report(service, folder_id, name, data, index, resumable, scheduler), None))
+            except Exception as e:
+                finished.put((i, "failed", e))
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(max(1, min(workers, total)))]
+    for t in threads:
+        t.start()
+    for done in range(1, total + 1):
+        i, outcome, error = finished.get()
+        outcomes[i] = outcome
+        if error is not None:
+            errors[i] = error
+        if progress is not None:
+            progress(done, total)
+    for t in threads:
+        t.join()
+    return outcomes, errors
+
+
+# =====================================
+# Persistent manifest + full sync
+# =====================================
+class DriveManifest:
+    """Drive IDs remembered between runs, stored as a JSON file.
+
+    folders maps "parent ID/term" to a term folder ID and files maps a folder
+    ID to its list_folder() index (file name -> id, md5Checksum). Entries are
+    trusted without a lookup and only corrected when Drive answers 404, so a
+    warm run makes no lookup calls; a folder is listed again once its listing
+    is older than max_age seconds, which picks up files deleted in Drive.
+    sources maps a source file ID (data.xlsx) to the version last processed
+    in full, so an unchanged workbook can be skipped, and snapshots maps
+    subject -> term -> student to a digest of the report last uploaded for
+    that row, so only edited rows are re-rendered. path=None keeps it in
+    memory only.
+    """
+
+    _save_lock = threading.Lock()  # shared by every instance, i.e. every app session
+
+    def __init__(self, path=None, max_age=24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self.folders = {}
+        self.files = {}
+        self.listed = {}  # folder ID -> time of its last listing
+        self.sources = {}  # source file ID -> {"md5Checksum", "modifiedTime", "template"}
+        self.snapshots = {}  # subject -> term -> student -> report digest
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                self.folders = data.get("folders", {})
+                self.files = data.get("files", {})
+                self.listed = data.get("listed", {})
+                self.sources = data.get("sources", {})
+                self.snapshots = data.get("snapshots", {})
+            except (OSError, ValueError):
+                pass  # unreadable manifest: start cold
+
+    @staticmethod
+    def folder_key(parent_id, name):
+        return f"{parent_id}/{name}"
+
+    def needs_listing(self, folder_id):
+        return folder_id not in self.files or time.time() - self.listed.get(folder_id, 0) > self.max_age
+
+    def set_index(self, folder_id, index):
+        self.files[folder_id] = index
+        self.listed[folder_id] = time.time()
+
+    def forget_folder(self, parent_id, name):
+        folder_id = self.folders.pop(self.folder_key(parent_id, name), None)
+        self.files.pop(folder_id, None)
+        self.listed.pop(folder_id, None)
+
+    def save(self):
+        if not self.path:
+            return
+        # App sessions share one manifest file: each save writes its own temp file, one at a time
+        with self._save_lock:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".part")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"folders": self.folders, "files": self.files, "listed": self.listed,
+                               "sources": self.sources, "snapshots": self.snapshots}, f)
+                os.replace(tmp, self.path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+
+
+def resolve_folders(service, root_id, terms, manifest, scheduler=None):
+    """({term: folder ID}, {term: error}) for the term folders under root_id.
+
+    IDs come from the manifest first, the rest from a batched search/create;
+    folders whose listing is missing or older than max_age are (re-)listed
+    into manifest.files.
+    """
+    folder_ids = {t: manifest.folders[manifest.folder_key(root_id, t)]
+                  for t in terms if manifest.folder_key(root_id, t) in manifest.folders}
+    # Remembered folders due for a re-listing are checked first: one moved to the trash
+    # still accepts uploads without any error, so a 404 would never reveal it
+    stale = {t: folder_id for t, folder_id in folder_ids.items() if manifest.needs_listing(folder_id)}
+    checks = {t: service.files().get(fileId=folder_id, fields="id, trashed", supportsAllDrives=True)
+              for t, folder_id in stale.items()}
+    metas, check_errors = execute_batch(service, checks, scheduler) if checks else ({}, {})
+    for term in stale:
+        if metas.get(term, {}).get("trashed") or is_not_found(check_errors.get(term)):
+            manifest.forget_folder(root_id, term)
+            del folder_ids[term]
+    found, errors = ensure_folders(service, root_id, [t for t in terms if t not in folder_ids], scheduler)
+    for term, folder_id in found.items():
+        manifest.folders[manifest.folder_key(root_id, term)] = folder_id
+    folder_ids.update(found)
+    for folder_id in folder_ids.values():
+        if manifest.needs_listing(folder_id):
+            manifest.set_index(folder_id, list_folder(service, folder_id, scheduler))
+    return folder_ids, errors
+
+
+def sync_reports(service, make_service, root_id, reports, workers=4, resumable=False, progress=None,
+                 scheduler=None, manifest=None):
+    """Uploads [(term, file name, PDF bytes)] into one folder per term under root_id.
+
+    Term folders and their contents come from the manifest when known,
+    otherwise from batched folder lookups and one listing per folder; a
+    remembered folder is checked for being trashed whenever it is re-listed. Uploads
+    run on upload_reports' worker pool. If a remembered folder turns out to
+    be gone (404), it is looked up again and all of its reports retried once.
+    Returns (outcomes, errors) aligned with reports; the manifest is saved.
+    """
+    manifest = manifest if manifest is not None else DriveManifest()
+    outcomes = ["failed"] * len(reports)
+    errors = {}
+    pending = list(range(len(reports)))
+
+    for attempt in range(2):
+        terms = list(dict.fromkeys(reports[i][0] for i in pending))
+        folder_ids, folder_errors = resolve_folders(service, root_id, terms, manifest, scheduler)
+        ready = []
+        for i in pending:
+            term = reports[i][0]
+            if term in folder_ids:
+                ready.append(i)
+            else:
+                errors[i] = folder_errors.get(term)
+        jobs = [(folder_ids[reports[i][0]], reports[i][1], reports[i][2], manifest.files[folder_ids[reports[i][0]]])
+                for i in ready]
+        done, failed = upload_reports(make_service, jobs, workers, resumable, progress if attempt == 0 else None,
+                                      scheduler)
+        gone = set()
+        for j, i in enumerate(ready):
+            outcomes[i] = done[j]
+            if j in failed:
+                errors[i] = failed[j]
+                if is_not_found(failed[j]):
+                    gone.add(reports[i][0])
+            else:
+                errors.pop(i, None)
+        if not gone or attempt == 1:
+            break
+        # The folder itself was deleted: forget it and resolve it again. Every report of that
+        # term is retried, including the ones "skipped" against the forgotten folder's MD5s
+        for term in gone:
+            manifest.forget_folder(root_id, term)
+        pending = [i for i in ready if reports[i][0] in gone]
+
+    manifest.save()
+    return outcomes, errors
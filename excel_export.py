@@ -0,0 +1,185 @@
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from io import BytesIO
+from xml.sax.saxutils import escape as xml_escape
+
+import numpy as np
+import xlsxwriter
+from openpyxl.utils.cell import column_index_from_string, coordinate_from_string, get_column_letter
+
+# =====================================
+# "Original Format" Excel export
+# =====================================
+DOTTED_LINE = "--------------------------"
+BLOCK_GAP = 2  # empty rows between term tables
+
+
+def _cell_value(value):
+    # Blank cell for missing values, whole numbers written as ints
+    if isinstance(value, float):
+        if np.isnan(value):
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def _decimal_scores(frame):
+    # float32 -> float64 via the shortest decimal form, so 80.1 is written as 80.1 and not 80.0999984
+    float32_cols = [col for col in frame.columns if frame[col].dtype == np.float32]
+    if not float32_cols:
+        return frame
+    return frame.astype({col: str for col in float32_cols}).astype({col: "float64" for col in float32_cols})
+
+
+def _score_columns(frame):
+    return [values.tolist() for _, values in _decimal_scores(frame).items()]
+
+
+def save_to_stacked_format(df_to_save, sheet_name, skill_cols):
+    """Reconstructs the original Excel layout with Terms and dotted lines.
+
+    Rows are streamed through xlsxwriter's constant_memory mode in one grouped
+    pass over the terms, so memory stays flat however many students there are.
+    """
+    output = BytesIO()
+    wb = xlsxwriter.Workbook(output, {"constant_memory": True, "strings_to_urls": False})
+    ws = wb.add_worksheet(sheet_name)
+    bold = wb.add_format({"bold": True})
+
+    headers = ["Student Name"] + list(skill_cols)
+    current_row = 0
+    # Term is an ordered categorical, so groupby walks the terms in month_order
+    for term, term_data in df_to_save.groupby("Term", observed=True, sort=True):
+        ws.write(current_row, 0, f"Term: {term}", bold)
+        ws.write(current_row + 1, 0, DOTTED_LINE)
+        ws.write_row(current_row + 2, 0, headers, bold)
+        current_row += 3
+
+        names = term_data["Student Name"].astype(object).tolist()
+        for row in zip(names, *_score_columns(term_data[list(skill_cols)])):
+            ws.write_row(current_row, 0, [_cell_value(v) for v in row])
+            current_row += 1
+
+        # Add space between tables
+        current_row += BLOCK_GAP
+
+    wb.close()
+    return output.getvalue()
+
+
+# =====================================
+# Write-back: patch edited cells into the uploaded workbook
+# =====================================
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_ROW_RE = re.compile(r'<row\b([^>]*?)(/>|>(.*?)</row>)', re.S)
+_CELL_RE = re.compile(r'<c\b([^>]*?)(/>|>.*?</c>)', re.S)
+_ATTR_RE = r'\b{}="([^"]*)"'
+
+
+def edited_cells(original, current, columns):
+    """Compares an edited table with the one parsed from the upload.
+
+    Returns ({(row, column): value} in 1-based sheet coordinates, skipped),
+    where skipped counts rows that cannot be patched in place (moved to
+    another term, or without a recorded source position).
+    """
+    positions = original.attrs.get("cell_positions")
+    common = current.index.intersection(original.index)
+    old = _decimal_scores(original.loc[common, columns]).astype(object)
+    new = _decimal_scores(current.loc[common, columns]).astype(object)
+    changed = ~((old == new) | (old.isna() & new.isna())).to_numpy()
+
+    skipped = 0
+    if "Term" in original.columns and "Term" in current.columns:
+        moved = (original.loc[common, "Term"].astype(object) != current.loc[common, "Term"].astype(object)).to_numpy()
+        skipped += int((moved & changed.any(axis=1)).sum())
+        changed &= ~moved[:, None]
+
+    cells = {}
+    for i, j in zip(*changed.nonzero()):
+        pos = positions.cell(common[i], columns[j]) if positions is not None else None
+        if pos is None:
+            skipped += 1
+            continue
+        cells[pos] = _cell_value(new.iat[i, j])
+    return cells, skipped
+
+
+def _sheet_paths(zin):
+    """{sheet name: zip member path of its worksheet XML}."""
+    workbook = ET.fromstring(zin.read("xl/workbook.xml"))
+    rels = ET.fromstring(zin.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{_PKG_REL_NS}Relationship")}
+
+    paths = {}
+    for sheet in workbook.iter(f"{_MAIN_NS}sheet"):
+        target = targets.get(sheet.get(f"{_REL_NS}id"), "")
+        paths[sheet.get("name")] = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    return paths
+
+
+def _cell_xml(ref, style, value):
+    style_attr = f' s="{style}"' if style is not None else ""
+    if value is None:
+        return f'<c r="{ref}"{style_attr}/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{ref}"{style_attr}><v>{value!r}</v></c>'
+    text = xml_escape(str(value))
+    return f'<c r="{ref}"{style_attr} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _patch_row(attrs, body, row_number, updates):
+    cells = {}
+    for m in _CELL_RE.finditer(body or ""):
+        ref = re.search(_ATTR_RE.format("r"), m.group(1)).group(1)
+        cells[column_index_from_string(coordinate_from_string(ref)[0])] = (m.group(0), m.group(1))
+
+    for col, value in updates.items():
+        old_attrs = cells.get(col, (None, ""))[1]
+        style = re.search(_ATTR_RE.format("s"), old_attrs)
+        ref = f"{get_column_letter(col)}{row_number}"
+        cells[col] = (_cell_xml(ref, style.group(1) if style else None, value), None)
+
+    # spans is only a hint and may be wrong once cells are added, so drop it
+    attrs = re.sub(r'\s+spans="[^"]*"', "", attrs)
+    return f"<row{attrs}>" + "".join(cells[c][0] for c in sorted(cells)) + "</row>"
+
+
+def _patch_sheet_xml(xml, cells):
+    by_row = {}
+    for (row, col), value in cells.items():
+        by_row.setdefault(row, {})[col] = value
+
+    def fix(m):
+        row_number = int(re.search(_ATTR_RE.format("r"), m.group(1)).group(1))
+        updates = by_row.get(row_number)
+        if not updates:
+            return m.group(0)
+        return _patch_row(m.group(1), m.group(3), row_number, updates)
+
+    return _ROW_RE.sub(fix, xml.decode("utf-8")).encode("utf-8")
+
+
+def patch_workbook(source_bytes, sheet_cells):
+    """Returns the uploaded workbook with only the given cells rewritten.
+
+    sheet_cells maps sheet name -> {(row, column): value}. Every other zip
+    member (other subject sheets, styles, images...) is copied through
+    without being parsed, and untouched rows of the edited sheets are kept
+    verbatim, so the work grows with the number of edits.
+    """
+    output = BytesIO()
+    with zipfile.ZipFile(BytesIO(source_bytes)) as zin:
+        paths = _sheet_paths(zin)
+        targets = {paths[name]: cells for name, cells in sheet_cells.items() if cells and name in paths}
+        with zipfile.ZipFile(output, "w") as zout:
+            for item in zin.infolist():
+                data = zin.read(item)
+                if item.filename in targets:
+                    data = _patch_sheet_xml(data, targets[item.filename])
+                zout.writestr(item, data)
+    return output.getvalue()
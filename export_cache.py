@@ -0,0 +1,191 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+
+def export_fingerprint(kind, df, sheet_name, terms=None):
+    """Key for an export artifact: the table contents, the sheet and the selected terms."""
+    h = hashlib.sha256()
+    h.update(f"{kind}|{sheet_name}|{list(terms) if terms is not None else '*'}|".encode())
+    h.update("|".join(map(str, df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """Size-bounded on-disk LRU of built export files (xlsx, ZIP).
+
+    Files are named by their fingerprint, so an artifact is rebuilt only when
+    the data behind it changes. Reading an entry refreshes its mtime, and the
+    oldest files are deleted once the directory exceeds max_bytes.
+    """
+
+    def __init__(self, directory=None, max_bytes=512 * 1024 * 1024):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "student_report_exports")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, f"{key}{suffix}")
+
+    def get(self, key, suffix):
+        """Path of a cached artifact (refreshing its LRU position), or None."""
+        path = self._path(key, suffix)
+        with self._lock:
+            if not os.path.exists(path):
+                return None
+            os.utime(path)
+            self.hits += 1
+            return path
+
+    def build(self, key, suffix, builder):
+        """Returns the artifact path, calling builder() -> bytes only if it is not cached."""
+        return self.build_stream(key, suffix, lambda f: f.write(builder()))
+
+    def build_stream(self, key, suffix, writer):
+        """Like build(), but writer(f) writes the artifact straight into the cache file.
+
+        Large exports (the PDF ZIP) are never held in memory as a whole.
+        """
+        path = self.get(key, suffix)
+        if path is not None:
+            return path
+
+        path = self._path(key, suffix)
+        # Write to a temp name first so readers never see a half-written file
+        tmp = f"{path}.{threading.get_ident()}.part"
+        try:
+            with open(tmp, "wb") as f:
+                writer(f)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            self.misses += 1
+            os.replace(tmp, path)
+            self._evict(keep=path)
+        return path
+
+    def _evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.directory):
+            full = os.path.join(self.directory, name)
+            if name.endswith(".part") or not os.path.isfile(full):
+                continue
+            st = os.stat(full)
+            entries.append((st.st_mtime, st.st_size, full))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, full in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if full == keep:
+                continue
+            os.remove(full)
+            total -= size
+
+
+class RenderCache:
+    """Size-bounded on-disk store of rendered report PDFs, keyed by content hash.
+
+    Keys come from ReportTemplate.cache_key, which covers everything that goes
+    into a report (template version, title, student, scores, grade...), so a
+    hit is always byte-identical to a fresh render. All PDFs live in one
+    SQLite file; lookups and inserts are batched, and the least recently used
+    reports are dropped once the stored PDFs exceed max_bytes.
+    """
+
+    _BATCH = 500           # keys per IN (...) query, below SQLite's variable limit
+    TOUCH_INTERVAL = 3600  # seconds between LRU timestamp refreshes of an entry
+
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024):
+        self.path = path or os.path.join(tempfile.gettempdir(), "student_report_renders.sqlite")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        # A lost write only means a re-render, so trade durability for speed
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS reports "
+            "(key TEXT PRIMARY KEY, pdf BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def _batches(self, keys):
+        keys = list(keys)
+        for i in range(0, len(keys), self._BATCH):
+            yield keys[i:i + self._BATCH]
+
+    def existing(self, keys):
+        """The subset of keys that are cached (PDF bytes are not loaded)."""
+        found = set()
+        with self._lock:
+            for batch in self._batches(keys):
+                marks = ",".join("?" * len(batch))
+                found.update(k for (k,) in self._db.execute(f"SELECT key FROM reports WHERE key IN ({marks})", batch))
+        return found
+
+    def get_many(self, keys):
+        """{key: pdf bytes} for the cached keys; refreshes their LRU position."""
+        out = {}
+        now = time.time()
+        touched = 0
+        with self._lock:
+            for batch in self._batches(keys):
+                marks = ",".join("?" * len(batch))
+                out.update(self._db.execute(f"SELECT key, pdf FROM reports WHERE key IN ({marks})", batch))
+                # Coarse LRU: only rewrite timestamps older than TOUCH_INTERVAL
+                touched += self._db.execute(
+                    f"UPDATE reports SET used = ? WHERE used < ? AND key IN ({marks})",
+                    [now, now - self.TOUCH_INTERVAL, *batch],
+                ).rowcount
+            if touched:
+                self._db.commit()
+            self.hits += len(out)
+        return out
+
+    def put_many(self, items):
+        """Stores {key: pdf bytes}, then evicts the oldest reports if over budget."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO reports (key, pdf, size, used) VALUES (?, ?, ?, ?)",
+                [(k, pdf, len(pdf), now) for k, pdf in items.items()],
+            )
+            self.misses += len(items)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM reports").fetchone()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed, freed = [], 0
+        for key, size in self._db.execute("SELECT key, size FROM reports ORDER BY used"):
+            if freed >= excess:
+                break
+            doomed.append((key,))
+            freed += size
+        self._db.executemany("DELETE FROM reports WHERE key = ?", doomed)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM reports").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
@@ -0,0 +1,238 @@
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+# =====================================
+# Offline stand-in for the Drive v3 client
+# =====================================
+# Implements just the surface drive_sync and the scheduler use: files().list
+# (with the q grammar they build), create, update, get, get_media and batch
+# requests. Latency, quota errors and random failures can be injected, and
+# every call is counted, so the upload pipeline can be load-tested offline.
+FOLDER_MIME = "application/vnd.google-apps.folder"
+_CLAUSE_RE = re.compile(
+    r"(?P<field>name|mimeType)\s*=\s*'(?P<value>(?:\\.|[^'\\])*)'"
+    r"|'(?P<parent>(?:\\.|[^'\\])*)'\s+in\s+parents"
+    r"|trashed\s*=\s*(?P<trashed>true|false)"
+)
+
+
+def _unquote(value):
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+def _http_error(status, reason, message, error_info=None):
+    # error_info adds a google.rpc.ErrorInfo "details" entry, as current quota errors do
+    body = {"error": {"code": status, "message": message, "errors": [{"reason": reason, "message": message}]}}
+    if error_info:
+        body["error"]["details"] = [{"@type": "type.googleapis.com/google.rpc.ErrorInfo", "reason": error_info,
+                                     "domain": "googleapis.com", "metadata": {"service": "drive.googleapis.com"}}]
+    return HttpError(httplib2.Response({"status": status}), json.dumps(body).encode())
+
+
+class FakeDrive:
+    """In-memory Drive shared by every client built from it (one per thread, like the real thing).
+
+    latency: seconds slept per call (batches count once). quota_rps: calls
+    per second above which a 403 userRateLimitExceeded is raised.
+    error_rate: probability of a random 500 on any call. fail_on: optional
+    function(method, kwargs) returning an HttpError to raise, for targeted
+    failures. calls counts every executed call by method name.
+    """
+
+    def __init__(self, latency=0.0, quota_rps=None, error_rate=0.0, fail_on=None, seed=0):
+        self.latency = latency
+        self.quota_rps = quota_rps
+        self.error_rate = error_rate
+        self.fail_on = fail_on
+        self.files = {}  # id -> metadata (+ "content")
+        self.calls = Counter()
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._window = []  # call timestamps within the last second (quota)
+        self._lock = threading.Lock()
+
+    def service(self):
+        return FakeService(self)
+
+    # --- Direct helpers (setup and assertions, not counted) ---
+    def add_file(self, name, parents, content=b"", mime_type="application/octet-stream"):
+        return self._create({"name": name, "parents": parents, "mimeType": mime_type}, content)["id"]
+
+    def add_folder(self, name, parent=None):
+        return self._create({"name": name, "parents": [parent] if parent else [], "mimeType": FOLDER_MIME}, None)["id"]
+
+    def set_content(self, file_id, content):
+        """Replaces a file's bytes as if it were edited in Drive (new md5Checksum and modifiedTime)."""
+        with self._lock:
+            self._set_content(self._get(file_id), content)
+
+    def children(self, parent, trashed=False):
+        return [f for f in self.files.values() if parent in f["parents"] and f["trashed"] == trashed]
+
+    # --- Call handling ---
+    def _check(self, method, kwargs):
+        with self._lock:
+            self.calls[method] += 1
+            now = time.monotonic()
+            if self.quota_rps is not None:
+                self._window = [t for t in self._window if now - t < 1.0]
+                self._window.append(now)
+                if len(self._window) > self.quota_rps:
+                    raise _http_error(403, "userRateLimitExceeded", "User rate limit exceeded.",
+                                      error_info="RATE_LIMIT_EXCEEDED")
+            if self.error_rate and self._random.random() < self.error_rate:
+                raise _http_error(500, "backendError", "Backend Error")
+        if self.fail_on is not None:
+            error = self.fail_on(method, kwargs)
+            if error is not None:
+                raise error
+
+    def _create(self, body, content):
+        with self._lock:
+            file_id = f"fake{next(self._ids)}"
+            meta = {
+                "id": file_id,
+                "name": body["name"],
+                "mimeType": body.get("mimeType", "application/pdf"),
+                "parents": list(body.get("parents", [])),
+                "trashed": False,
+            }
+            self.files[file_id] = meta
+            self._set_content(meta, content)
+            return meta
+
+    @staticmethod
+    def _set_content(meta, content):
+        meta["modifiedTime"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        if content is not None:
+            meta["content"] = content
+            meta["md5Checksum"] = hashlib.md5(content).hexdigest()
+
+    def _get(self, file_id):
+        meta = self.files.get(file_id)
+        if meta is None:
+            raise _http_error(404, "notFound", f"File not found: {file_id}.")
+        return meta
+
+    def _matches(self, meta, q):
+        for m in _CLAUSE_RE.finditer(q):
+            if m.group("field") and meta.get(m.group("field")) != _unquote(m.group("value")):
+                return False
+            if m.group("parent") is not None and _unquote(m.group("parent")) not in meta["parents"]:
+                return False
+            if m.group("trashed") and meta["trashed"] != (m.group("trashed") == "true"):
+                return False
+        return True
+
+
+def _public(meta):
+    return {k: v for k, v in meta.items() if k != "content"}
+
+
+def _media_bytes(media_body):
+    return media_body.getbytes(0, media_body.size()) if media_body is not None else None
+
+
+class FakeRequest:
+    def __init__(self, drive, method, kwargs, fn):
+        self.drive = drive
+        self.method = method
+        self.kwargs = kwargs
+        self.fn = fn
+
+    def execute(self, num_retries=0, counted=True):
+        if counted and self.drive.latency:
+            time.sleep(self.drive.latency)
+        self.drive._check(self.method, self.kwargs)
+        return self.fn()
+
+
+class FakeFiles:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def _request(self, method, kwargs, fn):
+        return FakeRequest(self.drive, method, kwargs, fn)
+
+    def list(self, q="", fields=None, pageSize=100, pageToken=None, **kwargs):
+        def run():
+            with self.drive._lock:
+                hits = [_public(f) for f in self.drive.files.values() if self.drive._matches(f, q)]
+            start = int(pageToken or 0)
+            page = {"files": hits[start:start + pageSize]}
+            if start + pageSize < len(hits):
+                page["nextPageToken"] = str(start + pageSize)
+            return page
+        return self._request("list", {"q": q}, run)
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        def run():
+            for parent in body.get("parents", []):
+                self.drive._get(parent)  # 404 for a missing parent folder, as Drive does
+            return {"id": self.drive._create(body, _media_bytes(media_body))["id"]}
+        return self._request("create", {"body": body}, run)
+
+    def update(self, fileId=None, body=None, media_body=None, fields=None, **kwargs):
+        def run():
+            with self.drive._lock:
+                meta = self.drive._get(fileId)
+                for key, value in (body or {}).items():
+                    meta[key] = value
+                self.drive._set_content(meta, _media_bytes(media_body))
+                return {"id": fileId}
+        return self._request("update", {"fileId": fileId, "body": body}, run)
+
+    def get(self, fileId=None, fields=None, **kwargs):
+        def run():
+            with self.drive._lock:
+                return _public(self.drive._get(fileId))
+        return self._request("get", {"fileId": fileId}, run)
+
+    def get_media(self, fileId=None, **kwargs):
+        def run():
+            with self.drive._lock:
+                return self.drive._get(fileId).get("content", b"")
+        return self._request("get_media", {"fileId": fileId}, run)
+
+
+class FakeBatch:
+    def __init__(self, drive, callback):
+        self.drive = drive
+        self.callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request, callback or self.callback, request_id))
+
+    def execute(self, num_retries=0):
+        # One round trip for the whole batch; inner calls fail independently
+        if self.drive.latency:
+            time.sleep(self.drive.latency)
+        self.drive.calls["batch"] += 1
+        for request, callback, request_id in self._requests:
+            try:
+                response, error = request.execute(counted=False), None
+            except HttpError as e:
+                response, error = None, e
+            callback(request_id, response, error)
+
+
+class FakeService:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def files(self):
+        return FakeFiles(self.drive)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self.drive, callback)
@@ -0,0 +1,35 @@
+import numpy as np
+
+# =====================================
+# Grading (shared by the app and the scheduler)
+# =====================================
+# (minimum average, grade, remark), highest band first. An average below every
+# minimum (or missing) falls into the last band.
+GRADE_BOUNDARIES = [
+    (80, "A", "Excellent work!"),
+    (70, "B", "Good effort, keep improving!"),
+    (60, "C", "Needs improvement"),
+    (50, "D", "Needs improvement"),
+    (0, "F", "Needs improvement"),
+]
+
+
+def grade_averages(averages, boundaries=GRADE_BOUNDARIES):
+    """Returns (grades, remarks) arrays for a sequence of averages using binned lookups."""
+    bands = sorted(boundaries, key=lambda b: b[0])
+    cutoffs = np.array([b[0] for b in bands[1:]], dtype="float64")
+    grades = np.array([b[1] for b in bands], dtype=object)
+    remarks = np.array([b[2] for b in bands], dtype=object)
+
+    # NaN would sort above every cutoff, so send it to the lowest band explicitly
+    values = np.asarray(averages, dtype="float64")
+    values = np.where(np.isnan(values), -np.inf, values)
+    band = np.searchsorted(cutoffs, values, side="right")
+    return grades[band], remarks[band]
+
+
+def add_grades(df, skills, boundaries=GRADE_BOUNDARIES):
+    """Adds Average, Grade and Remarks columns to the whole frame at once."""
+    df["Average"] = df[skills].mean(axis=1)
+    df["Grade"], df["Remarks"] = grade_averages(df["Average"], boundaries)
+    return df
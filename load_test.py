@@ -0,0 +1,83 @@
+# End-to-end load test of the scheduled upload (automated_upload.run_upload) against FakeDrive.
+# Usage: python load_test.py [--subjects N] [--terms M] [--students K] [--latency S] ...
+import argparse
+import os
+import random
+import tempfile
+import time
+from io import BytesIO
+
+import xlsxwriter
+
+from benchmark import make_raw_sheet
+from automated_upload import run_upload
+from fake_drive import FakeDrive
+
+
+def make_workbook(n_subjects, n_terms, n_students, seed=0, rescore=0):
+    """xlsx bytes with n_subjects sheets of n_terms stacked term tables of n_students each.
+
+    rescore gives the first students of every term table new scores, to simulate edits.
+    """
+    rng = random.Random(seed + 1)
+    output = BytesIO()
+    wb = xlsxwriter.Workbook(output, {"constant_memory": True})
+    for s in range(n_subjects):
+        ws = wb.add_worksheet(f"Subject{s + 1}")
+        grid = make_raw_sheet(n_terms * n_students, n_terms, seed=seed + s)
+        for r, row in enumerate(grid.itertuples(index=False)):
+            row = list(row)
+            # Each term block is: title, dotted line, header, students, 2 blank rows
+            if 3 <= r % (n_students + 5) < 3 + rescore:
+                row[1:] = [rng.randint(0, 100) for _ in row[1:]]
+            ws.write_row(r, 0, ["" if v is None else v for v in row])
+    wb.close()
+    return output.getvalue()
+
+
+def run(drive, root_id, data_id, manifest_path, label, workers, rps, force=False):
+    drive.calls.clear()
+    t0 = time.perf_counter()
+    stats, scheduler = run_upload(drive.service(), drive.service, root_id, data_id, workers=workers, rps=rps,
+                                  manifest_path=manifest_path, verbose=False, force=force)
+    elapsed = time.perf_counter() - t0
+    print(f"⏱️ {label:<6} wall={elapsed:8.2f} s  {stats.summary()}")
+    print(f"   fake Drive calls: {dict(sorted(drive.calls.items()))}  (total {sum(drive.calls.values())})")
+    print(f"   scheduler: {scheduler.summary()}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Drive upload pipeline against an in-memory Drive")
+    parser.add_argument("--subjects", type=int, default=3)
+    parser.add_argument("--terms", type=int, default=4)
+    parser.add_argument("--students", type=int, default=25)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per simulated Drive round trip")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rps", type=float, default=1000.0, help="client-side request rate limit")
+    parser.add_argument("--quota", type=float, default=None, help="server-side quota (calls/s) before 403s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a random 500 per call")
+    parser.add_argument("--edit", type=float, default=0.1, help="fraction of reports changed before the last run")
+    args = parser.parse_args()
+
+    drive = FakeDrive(latency=args.latency, quota_rps=args.quota, error_rate=args.error_rate)
+    root_id = drive.add_folder("Reports")
+    data_id = drive.add_file("data.xlsx", [], make_workbook(args.subjects, args.terms, args.students))
+    print(f"📦 {args.subjects} subjects × {args.terms} terms × {args.students} students "
+          f"= {args.subjects * args.terms * args.students} reports")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest_path = os.path.join(tmp, "drive_manifest.json")
+        run(drive, root_id, data_id, manifest_path, "cold", args.workers, args.rps)
+        run(drive, root_id, data_id, manifest_path, "warm", args.workers, args.rps)
+        # Same workbook, but synced anyway: measures the manifest / MD5 skip path
+        run(drive, root_id, data_id, manifest_path, "forced", args.workers, args.rps, force=True)
+
+        # Re-score some students and sync once more: only their reports should be re-uploaded
+        drive.set_content(data_id, make_workbook(args.subjects, args.terms, args.students,
+                                                 rescore=int(args.students * args.edit)))
+        run(drive, root_id, data_id, manifest_path, "edited", args.workers, args.rps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from data_parser import load_workbook_tables
+
+
+def fingerprint(data):
+    """Content hash of an uploaded workbook (same bytes -> same key, whatever the file name)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ParseCache:
+    """Server-wide LRU of parsed subject tables, keyed by (workbook hash, sheet name).
+
+    One instance is shared by every Streamlit session, so a workbook opened by
+    several teachers is parsed once, even when they open it at the same time
+    (later callers wait for the parse already running). Entries are evicted least-recently-used
+    first when either the entry count or the memory budget is exceeded.
+    Callers must copy a returned table before editing it.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (digest, options, sheet) -> (df, nbytes)
+        self._sheet_names = {}         # (digest, options) -> [sheet, ...]
+        self._parsing = {}             # (digest, options) -> Event, set once its parse is done
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_workbook(self, data, keep_columns, term_order=None, digest=None):
+        """Returns {sheet_name: table} for the workbook bytes, parsing only on a miss."""
+        digest = digest or fingerprint(data)
+        book_key = (digest, (tuple(keep_columns), tuple(term_order or ())))
+
+        while True:
+            with self._lock:
+                names = self._sheet_names.get(book_key)
+                if names is not None and all(book_key + (n,) in self._entries for n in names):
+                    self.hits += 1
+                    for n in names:
+                        self._entries.move_to_end(book_key + (n,))
+                    return {n: self._entries[book_key + (n,)][0] for n in names}
+                parsing = self._parsing.get(book_key)
+                if parsing is None:
+                    parsing = self._parsing[book_key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another session is parsing this workbook: wait for it, then read its entries
+            parsing.wait()
+
+        try:
+            # Parse outside the lock so other sessions are not blocked meanwhile
+            tables = load_workbook_tables(BytesIO(data), keep_columns, term_order)
+            with self._lock:
+                self._sheet_names[book_key] = list(tables)
+                for name, df in tables.items():
+                    self._put(book_key + (name,), df)
+        finally:
+            with self._lock:
+                self._parsing.pop(book_key).set()
+        return tables
+
+    def _put(self, key, df):
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        nbytes = int(df.memory_usage(deep=True).sum())
+        self._entries[key] = (df, nbytes)
+        self._bytes += nbytes
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            old_key, (_, old_bytes) = self._entries.popitem(last=False)
+            self._bytes -= old_bytes
+            self.evictions += 1
+            book_key = old_key[:2]
+            if not any(k[:2] == book_key for k in self._entries):
+                self._sheet_names.pop(book_key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
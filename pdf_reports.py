@@ -0,0 +1,299 @@
+import hashlib
+import math
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from fpdf import FPDF
+
+# =====================================
+# Student report PDFs (template + stamping)
+# =====================================
+# Same page as the FPDF code it replaces: A4 in mm, 10 mm margins, Arial
+# (Helvetica) 16 bold title, 12 regular body, logo at x=100 y=8 w=33.
+K = 72 / 25.4                    # points per mm
+PAGE_W, PAGE_H = 210.0, 297.0
+MARGIN = 28.35 / K               # FPDF default margin (1 cm)
+CELL_MARGIN = MARGIN / 10
+DIVIDER = "-" * 30
+FONTS = {"F1": "Helvetica-Bold", "F2": "Helvetica", "F3": "Helvetica-Oblique"}
+# Reports are reproducible: a fixed metadata date instead of "now", and bump
+# RENDER_VERSION whenever render() prints the same inputs differently.
+CREATION_DATE = "20250101000000"
+RENDER_VERSION = 1
+
+
+def _pdf_text(text):
+    # WinAnsi standard fonts: latin-1, with \, ( and ) escaped (as FPDF._escape)
+    raw = str(text).encode("latin-1", errors="replace").decode("latin-1")
+    return raw.replace("\\", "\\\\").replace(")", "\\)").replace("(", "\\(").replace("\r", "\\r")
+
+
+def format_score(value):
+    """Score as printed on a report: missing -> 0, whole numbers without .0."""
+    if value is None or (isinstance(value, (float, np.floating)) and math.isnan(value)):
+        return "0"
+    if isinstance(value, np.float32):
+        value = float(str(value))
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class ReportTemplate:
+    """Builds the static part of a report PDF once, then stamps one PDF per student.
+
+    Fonts, the logo image XObject, the dividers and every line position are
+    serialized when the template is created. render() only formats the
+    variable text lines and the trailer, so a report costs a few string
+    joins instead of a full FPDF document build.
+    """
+
+    def __init__(self, skills, logo_path="logo.png"):
+        self.skills = list(skills)
+
+        # --- Fixed line layout (y in mm from the top, like FPDF's cursor) ---
+        y = MARGIN
+        static_ops = []
+        logo = None
+        if logo_path and os.path.exists(logo_path):
+            logo = FPDF()._parsepng(logo_path)
+            w = 33.0
+            h = w * logo["h"] / logo["w"]
+            static_ops.append("q %.2f 0 0 %.2f %.2f %.2f cm /I1 Do Q" % (w * K, h * K, 100 * K, (PAGE_H - (8 + h)) * K))
+        else:
+            static_ops.append("BT /F3 8.00 Tf ET")
+            static_ops.append(self._line_op(y, 5, 8, "[School Logo Placeholder]"))
+            y += 5
+        y += 20
+
+        slots = []  # (y, height, font size) of each variable line
+
+        def slot(h, size):
+            nonlocal y
+            slots.append((y, h, size))
+            y += h
+
+        slot(10, 16)                             # title (bold)
+        slot(8, 12)                              # Student:
+        self._divider_1 = self._line_op(y, 5, 12, DIVIDER)
+        y += 5
+        for _ in self.skills:
+            slot(8, 12)
+        self._divider_2 = self._line_op(y, 5, 12, DIVIDER)
+        y += 5
+        for _ in range(3):                       # Average, Grade, Remarks
+            slot(8, 12)
+
+        self._prefixes = ["BT %.2f %.2f Td (" % self._text_origin(sy, sh, size) for sy, sh, size in slots]
+        self._static_ops = "\n".join(static_ops)
+        self._build_objects(logo)
+
+    # --- Layout helpers ---
+    @staticmethod
+    def _text_origin(y, h, size_pt):
+        # FPDF.cell with align='' : text at x + c_margin, baseline centred in the cell
+        return (MARGIN + CELL_MARGIN) * K, (PAGE_H - (y + 0.5 * h + 0.3 * size_pt / K)) * K
+
+    def _line_op(self, y, h, size_pt, text):
+        return "BT %.2f %.2f Td (%s) Tj ET" % (*self._text_origin(y, h, size_pt), _pdf_text(text))
+
+    # --- Static objects ---
+    def _build_objects(self, logo):
+        objects = {
+            1: "<</Type /Catalog\n/Pages 2 0 R\n/OpenAction [3 0 R /FitH null]\n/PageLayout /OneColumn\n>>",
+            2: "<</Type /Pages\n/Kids [3 0 R ]\n/Count 1\n/MediaBox [0 0 %.2f %.2f]\n>>" % (PAGE_W * K, PAGE_H * K),
+        }
+        next_id = 5
+        font_refs = []
+        for name, base in FONTS.items():
+            objects[next_id] = f"<</Type /Font\n/BaseFont /{base}\n/Subtype /Type1\n/Encoding /WinAnsiEncoding\n>>"
+            font_refs.append(f"/{name} {next_id} 0 R")
+            next_id += 1
+
+        xobjects = ""
+        if logo is not None:
+            image_id = next_id
+            next_id += 1
+            image = [
+                "<</Type /XObject", "/Subtype /Image",
+                f"/Width {logo['w']}", f"/Height {logo['h']}",
+            ]
+            if logo["cs"] == "Indexed":
+                image.append(f"/ColorSpace [/Indexed /DeviceRGB {len(logo['pal']) // 3 - 1} {next_id} 0 R]")
+            else:
+                image.append(f"/ColorSpace /{logo['cs']}")
+            image.append(f"/BitsPerComponent {logo['bpc']}")
+            if "f" in logo:
+                image.append(f"/Filter /{logo['f']}")
+            if "dp" in logo:
+                image.append(f"/DecodeParms <<{logo['dp']}>>")
+            if isinstance(logo.get("trns"), list) and logo["trns"]:
+                image.append("/Mask [" + " ".join(f"{t} {t}" for t in logo["trns"]) + " ]")
+            smask_id = None
+            if "smask" in logo:
+                smask_id = next_id + (1 if logo["cs"] == "Indexed" else 0)
+                image.append(f"/SMask {smask_id} 0 R")
+            objects[image_id] = (image, _as_bytes(logo["data"]))
+            if logo["cs"] == "Indexed":
+                objects[next_id] = (["<</Filter /FlateDecode"], zlib.compress(_as_bytes(logo["pal"])))
+                next_id += 1
+            if smask_id is not None:
+                dp = f"/Predictor 15 /Colors 1 /BitsPerComponent 8 /Columns {logo['w']}"
+                objects[smask_id] = ([
+                    "<</Type /XObject", "/Subtype /Image", f"/Width {logo['w']}", f"/Height {logo['h']}",
+                    "/ColorSpace /DeviceGray", "/BitsPerComponent 8", f"/Filter /{logo['f']}", f"/DecodeParms <<{dp}>>",
+                ], _as_bytes(logo["smask"]))
+                next_id += 1
+            xobjects = f"/I1 {image_id} 0 R\n"
+
+        objects[4] = ("<<\n/ProcSet [/PDF /Text /ImageB /ImageC /ImageI]\n/Font <<\n" + "\n".join(font_refs)
+                      + "\n>>\n/XObject <<\n" + xobjects + ">>\n>>")
+        info_id = next_id
+        objects[info_id] = ("<<\n/Producer (Student Progress Report System)\n/CreationDate (D:%s)\n>>"
+                            % CREATION_DATE)
+        content_id = info_id + 1
+        objects[3] = f"<</Type /Page\n/Parent 2 0 R\n/Resources 4 0 R\n/Contents {content_id} 0 R>>"
+
+        # Serialize everything except the page content, which goes last so
+        # every static offset (and so the xref table) is fixed.
+        body = bytearray(b"%PDF-1.3\n")
+        offsets = {}
+        for obj_id in sorted(objects):
+            offsets[obj_id] = len(body)
+            obj = objects[obj_id]
+            body += f"{obj_id} 0 obj\n".encode()
+            if isinstance(obj, tuple):
+                lines, stream = obj
+                body += ("\n".join(lines) + f"\n/Length {len(stream)}>>\nstream\n").encode("latin-1")
+                body += stream + b"\nendstream\n"
+            else:
+                body += obj.encode("latin-1") + b"\n"
+            body += b"endobj\n"
+
+        offsets[content_id] = len(body)
+        self._prefix = bytes(body) + f"{content_id} 0 obj\n".encode()
+        xref = [f"xref\n0 {content_id + 1}\n", "0000000000 65535 f \n"]
+        xref += ["%010d 00000 n \n" % offsets[i] for i in range(1, content_id + 1)]
+        xref.append(f"trailer\n<<\n/Size {content_id + 1}\n/Root 1 0 R\n/Info {info_id} 0 R\n>>\nstartxref\n")
+        self._xref = "".join(xref).encode()
+
+        # Identifies the exact output of this template (layout, logo, skills)
+        h = hashlib.sha256(f"{RENDER_VERSION}|{self._static_ops}|{self._prefixes}|{self._divider_1}|{self._divider_2}".encode())
+        h.update(self._prefix)
+        h.update(self._xref)
+        self.version = h.hexdigest()
+
+    # --- Stamping ---
+    def render(self, title, student, scores, average, grade, remarks):
+        """One report PDF (bytes). scores is a sequence aligned with the template's skills."""
+        lines = [title, f"Student: {student}"]
+        lines += [f"{s}: {format_score(v)}" for s, v in zip(self.skills, scores)]
+        lines += [f"Average: {average:.2f}", f"Grade: {grade}", f"Remarks: {remarks}"]
+
+        ops = [self._static_ops, "BT /F1 16.00 Tf ET", self._prefixes[0] + _pdf_text(lines[0]) + ") Tj ET",
+               "BT /F2 12.00 Tf ET", self._prefixes[1] + _pdf_text(lines[1]) + ") Tj ET", self._divider_1]
+        n = len(self.skills)
+        ops += [p + _pdf_text(t) + ") Tj ET" for p, t in zip(self._prefixes[2:2 + n], lines[2:2 + n])]
+        ops.append(self._divider_2)
+        ops += [p + _pdf_text(t) + ") Tj ET" for p, t in zip(self._prefixes[2 + n:], lines[2 + n:])]
+
+        content = "\n".join(ops).encode("latin-1")
+        stream = b"<</Length %d>>\nstream\n%s\nendstream\nendobj\n" % (len(content), content)
+        return b"".join([self._prefix, stream, self._xref, b"%d\n%%%%EOF\n" % (len(self._prefix) + len(stream))])
+
+    def job(self, row, title):
+        """render() arguments for one graded table row, as plain picklable values."""
+        return (title, str(row["Student Name"]).strip(), [format_score(row[s]) for s in self.skills],
+                float(row["Average"]), str(row["Grade"]), str(row["Remarks"]))
+
+    def cache_key(self, job):
+        """Content hash of one report: the template version plus every rendered value."""
+        return hashlib.sha256(f"{self.version}|{job!r}".encode()).hexdigest()
+
+    def render_row(self, row, title):
+        """Report for one graded table row (Student Name, skills, Average, Grade, Remarks)."""
+        return self.render(*self.job(row, title))
+
+
+def _as_bytes(data):
+    return data if isinstance(data, bytes) else data.encode("latin-1")
+
+
+# =====================================
+# Parallel rendering (process pool)
+# =====================================
+# Stamping costs ~20 µs per report, so a pool only pays off for very large
+# jobs; smaller ones are rendered in-process.
+PARALLEL_MIN_JOBS = 20_000
+_worker_template = None
+
+
+def _init_worker(template):
+    # The pickled template is sent once per worker, not once per chunk
+    global _worker_template
+    _worker_template = template
+
+
+def _render_chunk(jobs):
+    return [_worker_template.render(*job) for job in jobs]
+
+
+def _render_missing(template, jobs, todo, keys, workers, chunk_size, cache, min_jobs):
+    # Renders jobs[i] for i in todo, in order, storing each finished chunk in the cache
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    batches = [[jobs[i] for i in chunk] for chunk in chunks]
+
+    if workers <= 1 or len(batches) <= 1 or len(todo) < min_jobs:
+        results = map(lambda batch: [template.render(*job) for job in batch], batches)
+        pool = None
+    else:
+        # Never fork: callers (Streamlit) are multi-threaded, and a forked child can deadlock
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(batches)), initializer=_init_worker,
+                                   initargs=(template,), mp_context=multiprocessing.get_context("forkserver"))
+        results = pool.map(_render_chunk, batches)
+
+    try:
+        for chunk, pdfs in zip(chunks, results):
+            if cache is not None:
+                cache.put_many({keys[i]: pdf for i, pdf in zip(chunk, pdfs)})
+            yield from pdfs
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def render_reports(template, jobs, workers=1, chunk_size=250, progress=None, cache=None,
+                   min_jobs=PARALLEL_MIN_JOBS):
+    """Yields one PDF per job (see ReportTemplate.job), in the order of jobs.
+
+    With a cache (export_cache.RenderCache) unchanged reports are read back
+    instead of rendered. The rest are sent to a process pool in chunks of
+    chunk_size when workers > 1 and at least min_jobs need rendering; results still come back in input order, so
+    callers can write them straight into a ZIP. progress(done, total) is
+    called after every chunk.
+    """
+    jobs = list(jobs)
+    total = len(jobs)
+    keys = [template.cache_key(job) for job in jobs] if cache is not None else [None] * total
+    hits = cache.existing(keys) if cache is not None else set()
+    fresh = _render_missing(template, jobs, [i for i, key in enumerate(keys) if key not in hits],
+                            keys, workers, chunk_size, cache, min_jobs)
+
+    try:
+        for start in range(0, total, chunk_size):
+            block = range(start, min(start + chunk_size, total))
+            stored = cache.get_many([keys[i] for i in block if keys[i] in hits]) if hits else {}
+            for i in block:
+                if keys[i] in hits:
+                    # An entry evicted since the lookup is simply rendered here
+                    pdf = stored.get(keys[i])
+                    yield pdf if pdf is not None else template.render(*jobs[i])
+                else:
+                    yield next(fresh)
+            if progress is not None:
+                progress(block.stop, total)
+    finally:
+        fresh.close()
@@ -1,7 +1,6 @@
 import streamlit as st
-import pandas as pd
-from fpdf import FPDF
-from io import BytesIO
+import os
+import tempfile
 import zipfile
 import json
 import base64
@@ -9,10 +8,14 @@ import requests
 import altair as alt
 from datetime import datetime
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
 from google.oauth2 import service_account
-import openpyxl
-from openpyxl.styles import Font
+from analytics import AggregateCube, add_growth, apply_edits
+from drive_sync import DriveManifest, RequestScheduler, UploadStats, service_factory, sync_reports
+from excel_export import edited_cells, patch_workbook, save_to_stacked_format
+from export_cache import ArtifactCache, RenderCache, export_fingerprint
+from parse_cache import ParseCache, fingerprint
+from pdf_reports import ReportTemplate, render_reports
+from validation import AUDIT_RULES, audit_table, audit_summary, status_labels
 import base64
 
 def add_custom_style(logo_path):
@@ -165,28 +168,41 @@ if st.sidebar.button("Update GitHub Schedule"):
 # =====================================
 # 3. Data Parsing Engine
 # =====================================
-def extract_and_flatten(df_raw):
-    rows = []
-    i = 0
-    while i < len(df_raw):
-        cell = str(df_raw.iloc[i, 0])
-        if cell.startswith("Term:"):
-            term = cell.replace("Term:", "").strip()
-            header_row = i + 2
-            headers = [str(h).strip() for h in df_raw.iloc[header_row].tolist()]
-            j = header_row + 1
-            while j < len(df_raw) and pd.notna(df_raw.iloc[j, 0]):
-                row_data = dict(zip(headers, df_raw.iloc[j].tolist()))
-                row_data["Term"] = term
-                rows.append(row_data)
-                j += 1
-            i = j
-        else: i += 1
-    return pd.DataFrame(rows)
+# Parsing lives in data_parser.py (shared with automated_upload.py)
 
 # =====================================
 # 4. File Upload & State Management
 # =====================================
+@st.cache_resource
+def get_export_cache():
+    # Built xlsx/ZIP files on disk, shared by all sessions
+    return ArtifactCache(
+        directory=os.environ.get("EXPORT_CACHE_DIR"),
+        max_bytes=int(os.environ.get("EXPORT_CACHE_MB", 512)) * 1024 * 1024,
+    )
+
+@st.cache_resource
+def get_parse_cache():
+    # One cache for the whole server; budgets can be tuned with env vars
+    return ParseCache(
+        max_entries=int(os.environ.get("PARSE_CACHE_ENTRIES", 64)),
+        max_bytes=int(os.environ.get("PARSE_CACHE_MB", 256)) * 1024 * 1024,
+    )
+
+@st.cache_resource
+def get_report_template():
+    # Fonts, logo and layout are serialized once; each report only stamps its text
+    return ReportTemplate(skills, "logo.png")
+
+@st.cache_resource
+def get_render_cache():
+    # Opt-in: stamping a report costs about as much as reading it back, so the
+    # cache only pays off when RENDER_CACHE_PATH points at persistent storage
+    path = os.environ.get("RENDER_CACHE_PATH")
+    if not path:
+        return None
+    return RenderCache(path, max_bytes=int(os.environ.get("RENDER_CACHE_MB", 256)) * 1024 * 1024)
+
 uploaded_file = st.file_uploader("Upload Excel (.xlsx)", type=["xlsx"])
 
 if uploaded_file is None:
@@ -194,21 +210,39 @@ if uploaded_file is None:
     st.stop() # This prevents Tornado from running the rest of the heavy code
 
 if uploaded_file:
-    xls = pd.ExcelFile(uploaded_file)
-    selected_sheet = st.selectbox("Select Subject", xls.sheet_names)
+    # Parse the whole workbook once per content hash (shared by all sessions);
+    # switching subject is then a dict lookup
+    file_bytes = uploaded_file.getvalue()
+    workbook_id = fingerprint(file_bytes)
+    workbook_tables = get_parse_cache().get_workbook(file_bytes, ["Student Name"] + skills, month_order, digest=workbook_id)
+    if st.session_state.get("workbook_id") != workbook_id:
+        st.session_state["workbook_id"] = workbook_id
+        # Drop edited tables from a previous upload
+        for key in [k for k in st.session_state if k.startswith(("df_", "cube_", "audit_"))]:
+            del st.session_state[key]
+    cache_stats = get_parse_cache().stats()
+    st.sidebar.caption(f"Parse cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, {cache_stats['entries']} sheets")
+
+    selected_sheet = st.selectbox("Select Subject", list(workbook_tables))
     state_key = f"df_{selected_sheet}"
 
     # Initialize Session State if new sheet or file
     if state_key not in st.session_state:
-        df_raw = pd.read_excel(uploaded_file, sheet_name=selected_sheet, header=None)
-        st.session_state[state_key] = extract_and_flatten(df_raw)
+        st.session_state[state_key] = workbook_tables[selected_sheet].copy()
 
     # Use the Master Data from State
     master_df = st.session_state[state_key]
 
+    # Aggregate cube: built once per table, patched in place when edits are applied
+    cube_key = f"cube_{selected_sheet}"
+    if cube_key not in st.session_state:
+        st.session_state[cube_key] = AggregateCube(master_df, skills)
+    cube = st.session_state[cube_key]
+
     # --- Term Selection Filter ---
     st.subheader("📅 Term Selection")
-    all_terms = sorted(master_df["Term"].unique())
+    # Term is an ordered categorical (month_order), so categories are already chronological
+    all_terms = list(master_df["Term"].cat.remove_unused_categories().cat.categories)
     select_terms_active = st.checkbox("Filter by specific terms")
 
     if select_terms_active:
@@ -220,19 +254,34 @@ if uploaded_file:
 
     # Filtered Data for calculations
     df = master_df[master_df["Term"].isin(selected_terms)].copy()
-    for s in skills: df[s] = pd.to_numeric(df[s], errors='coerce')
 
     # =====================================
     # 5. Data Editor (The Fix & Validation)
     # =====================================
     st.header(f"✏️ Data Review & Editor – {selected_sheet}")
     
-    # Audit: Flagging Nulls
-    audit_df = df.copy()
-    audit_df.insert(0, "Status", audit_df.apply(lambda r: "🚨 MISSING" if r[skills].isnull().any() else "✅ OK", axis=1))
+    # Audit: vectorized rule flags over the whole table, cached per data version
+    audit_key = f"audit_{selected_sheet}"
+    cached_audit = st.session_state.get(audit_key)
+    if cached_audit is None or cached_audit["version"] != cube.version:
+        flags = audit_table(master_df, skills, master_df.attrs.get("non_numeric"))
+        cached_audit = {
+            "version": cube.version,
+            "status": status_labels(flags),
+            "flagged": flags.index[flags.any(axis=1).to_numpy()],
+            "flags": flags,
+        }
+        st.session_state[audit_key] = cached_audit
+
+    summary = audit_summary(cached_audit["flags"].loc[df.index])
+    st.caption(" · ".join(f"{AUDIT_RULES[rule]}: {count}" for rule, count in summary.items()))
+
+    # Names stay free text in the editor (not a category dropdown)
+    audit_df = df.astype({"Student Name": object})
+    audit_df.insert(0, "Status", cached_audit["status"].loc[df.index])
     
     show_nulls = st.checkbox("🔍 View only rows with 🚨")
-    display_df = audit_df[audit_df["Status"] == "🚨 MISSING"] if show_nulls else audit_df
+    display_df = audit_df.loc[audit_df.index.intersection(cached_audit["flagged"])] if show_nulls else audit_df
 
     edited_df = st.data_editor(display_df, num_rows="dynamic", use_container_width=True, key=f"editor_{state_key}")
 
@@ -240,80 +289,71 @@ if uploaded_file:
     with col_save:
         if st.button("🔄 Apply Edits to Dashboard", use_container_width=True):
             cleaned_edits = edited_df.drop(columns=["Status"])
-            st.session_state[state_key].update(cleaned_edits)
-            st.success("Changes Saved to Session!")
+            # Only rows whose values actually changed are written, re-graded and re-aggregated
+            changed_rows = apply_edits(st.session_state[state_key], cleaned_edits)
+            cube.update_rows(changed_rows, st.session_state[state_key])
+            st.success(f"Changes Saved to Session! ({len(changed_rows)} rows updated)")
             st.rerun()
 
-    # 2. UPDATED FUNCTION
-    def save_to_stacked_format(df_to_save, sheet_name, skill_cols):
-        """Reconstructs the original Excel layout with Terms and dotted lines."""
-        output = BytesIO()
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = sheet_name
-        
-        current_row = 1
-        
-        # Sort terms using the global month_order
-        terms = sorted(
-            df_to_save["Term"].unique(), 
-            key=lambda x: month_order.index(x) if x in month_order else 99
-        )
-        
-        for term in terms:
-            # Write Term Header
-            ws.cell(row=current_row, column=1, value=f"Term: {term}").font = Font(bold=True)
-            current_row += 1
-            
-            # Write Dotted Line
-            ws.cell(row=current_row, column=1, value="--------------------------")
-            current_row += 1
-            
-            # Write Table Headers
-            headers = ["Student Name"] + skill_cols
-            for col_num, header in enumerate(headers, 1):
-                ws.cell(row=current_row, column=col_num, value=header).font = Font(bold=True)
-            current_row += 1
-            
-            # Write Student Data
-            term_data = df_to_save[df_to_save["Term"] == term]
-            for _, row in term_data.iterrows():
-                ws.cell(row=current_row, column=1, value=row["Student Name"])
-                for col_num, skill in enumerate(skill_cols, 2):
-                    # We use .get() or index to ensure we match the right column
-                    ws.cell(row=current_row, column=col_num, value=row[skill])
-                current_row += 1
-            
-            # Add space between tables
-            current_row += 2
-            
-        wb.save(output)
-        return output.getvalue()
-    
+    # save_to_stacked_format (streaming writer) lives in excel_export.py
+
     # 3. UPDATED CALL (Inside your UI)
     with col_dl:
-        # Pass the variables explicitly to avoid NameErrors
-        stacked_excel_data = save_to_stacked_format(
-            st.session_state[state_key], 
-            selected_sheet, 
-            skills
-        )
-        
-        st.download_button(
-            label="📥 Download Corrected Excel (Original Format)",
-            data=stacked_excel_data,
-            file_name=f"Corrected_{selected_sheet}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True
-        )
+        # Built only on request, then reused from the export cache until the table changes
+        xlsx_key = export_fingerprint("xlsx", st.session_state[state_key], selected_sheet)
+        xlsx_path = get_export_cache().get(xlsx_key, ".xlsx")
+        if xlsx_path is None and st.button("📥 Prepare Corrected Excel (Original Format)", use_container_width=True):
+            # Pass the variables explicitly to avoid NameErrors
+            xlsx_path = get_export_cache().build(xlsx_key, ".xlsx", lambda: save_to_stacked_format(
+                st.session_state[state_key], 
+                selected_sheet, 
+                skills
+            ))
+        
+        if xlsx_path:
+            with open(xlsx_path, "rb") as f:
+                st.download_button(
+                    label="📥 Download Corrected Excel (Original Format)",
+                    data=f.read(),
+                    file_name=f"Corrected_{selected_sheet}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True
+                )
+
+        # Write-back: the uploaded workbook (every subject) with only the edited cells rewritten
+        edited_sheets = {name: st.session_state[f"df_{name}"] for name in workbook_tables if f"df_{name}" in st.session_state}
+        patch_key = fingerprint("|".join(
+            export_fingerprint("patched", table, f"{workbook_id}/{name}") for name, table in edited_sheets.items()
+        ).encode())
+
+        def build_patched_workbook():
+            sheet_cells, skipped = {}, 0
+            for name, table in edited_sheets.items():
+                sheet_cells[name], sheet_skipped = edited_cells(workbook_tables[name], table, ["Student Name"] + skills)
+                skipped += sheet_skipped
+            if skipped:
+                st.warning(f"{skipped} edits change a student's term and can't be written in place; use the Original Format download for those.")
+            return patch_workbook(file_bytes, sheet_cells)
+
+        patched_path = get_export_cache().get(patch_key, ".xlsx")
+        if patched_path is None and st.button("📝 Prepare Full Workbook with Edits", use_container_width=True):
+            patched_path = get_export_cache().build(patch_key, ".xlsx", build_patched_workbook)
+
+        if patched_path:
+            with open(patched_path, "rb") as f:
+                st.download_button(
+                    label="📥 Download Full Workbook (edits written back)",
+                    data=f.read(),
+                    file_name=f"Corrected_{uploaded_file.name}",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True
+                )
 
     # =====================================
     # 6. Calculations & Metrics
     # =====================================
-    df["Average"] = df[skills].mean(axis=1)
-    df["Grade"] = df["Average"].apply(lambda x: "A" if x>=80 else "B" if x>=70 else "C" if x>=60 else "D" if x>=50 else "F")
-    df["Remarks"] = df["Average"].apply(
-        lambda x: "Excellent work!" if x >= 80 else "Good effort!" if x >= 70 else "Needs improvement")
+    # Average/Grade/Remarks are kept up to date by the cube
+    df = cube.rows[cube.rows["Term"].isin(selected_terms)]
     
     st.divider()
     st.subheader("📌 Performance Highlights")
@@ -324,15 +364,12 @@ if uploaded_file:
         top_row = df.loc[df['Average'].idxmax()]
         m1.metric("🏆 Top Student", top_row['Student Name'], f"{top_row['Average']:.1f} Avg")
 
-        # Metric 2: Growth Calculations
-        df_melted = df.melt(id_vars=['Term'], value_vars=skills, var_name='Skill', value_name='Score')
-        df_grouped = df_melted.groupby(['Term', 'Skill'])['Score'].mean().reset_index()
+        # Metric 2: Growth Calculations (sliced from the cube)
+        df_grouped = cube.term_skill_means(selected_terms)
         
         if len(selected_terms) > 0:
             base_t = selected_terms[0]
-            df_base = df_grouped[df_grouped['Term'] == base_t][['Skill', 'Score']].rename(columns={'Score':'Base'})
-            df_final = pd.merge(df_grouped, df_base, on='Skill')
-            df_final['Growth'] = ((df_final['Score'] - df_final['Base']) / df_final['Base']) * 100
+            df_final = add_growth(df_grouped, base_t)
             
             latest_g = df_final[df_final['Term'] == selected_terms[-1]]
             if not latest_g.empty:
@@ -340,7 +377,7 @@ if uploaded_file:
                 m2.metric("📈 Most Improved", best_s['Skill'], f"{best_s['Growth']:.1f}% Growth")
 
         # Metric 3: Success Rate
-        rate = (len(df[df['Grade'].isin(['A', 'B'])]) / len(df)) * 100
+        rate = cube.success_rate(selected_terms)
         m3.metric("🎯 Class Success Rate", f"{rate:.0f}%", "Grades A & B")
 
         # =====================================
@@ -353,14 +390,11 @@ if uploaded_file:
         student_list = ["All Students"] + student_names
         search_query = st.selectbox("Search for a student:", student_list)
         
-        if search_query != "All Students":
-            active_df = df[df["Student Name"] == search_query].copy()
-        else:
-            active_df = df.copy()
+        active_student = None if search_query == "All Students" else search_query
         
         # --- DYNAMIC CALCULATION (Handles Missing Months) ---
-        df_melted_active = active_df.melt(id_vars=['Term'], value_vars=skills, var_name='Skill', value_name='Score')
-        df_final_active = df_melted_active.groupby(['Term', 'Skill'])['Score'].mean().reset_index()
+        df_final_active = cube.term_skill_means(selected_terms, active_student)
+        grade_counts = cube.grade_counts(selected_terms, active_student)
         
         if not df_final_active.empty:
             # 1. Identify the earliest available month for the current selection
@@ -369,13 +403,11 @@ if uploaded_file:
             
             if present_terms:
                 base_t = present_terms[0] 
-                df_base = df_final_active[df_final_active['Term'] == base_t][['Skill', 'Score']].rename(columns={'Score':'Base'})
                 
                 # 2. Use 'how=left' to keep months like June/August even if Jan is missing
-                df_final_active = pd.merge(df_final_active, df_base, on='Skill', how='left')
+                df_final_active = add_growth(df_final_active, base_t, how='left')
                 
-                # 3. Calculate Growth (Handle division by zero/NaN)
-                df_final_active['Growth'] = ((df_final_active['Score'] - df_final_active['Base']) / df_final_active['Base']) * 100
+                # 3. Handle division by zero/NaN
                 df_final_active['Growth'] = df_final_active['Growth'].fillna(0) # First month will show 0% growth
                 
         # =====================================
@@ -444,9 +476,9 @@ if uploaded_file:
         with col_chart2:
             st.subheader("Grade Distribution (%)")
             
-            if not active_df.empty:
-                base_pie = alt.Chart(active_df).encode(
-                    theta=alt.Theta(field="Grade", aggregate="count", type="quantitative", stack=True),
+            if grade_counts["count"].sum() > 0:
+                base_pie = alt.Chart(grade_counts).encode(
+                    theta=alt.Theta(field="count", type="quantitative", stack=True),
                     color=alt.Color(
                         field="Grade", 
                         type="nominal", 
@@ -461,7 +493,7 @@ if uploaded_file:
                 text = base_pie.mark_text(radius=100, size=14, fontWeight="bold", color="white").encode(
                     text=alt.Text('pct:Q', format='.0%')
                 ).transform_joinaggregate(
-                    total='count(*)'
+                    total='sum(count)'
                 ).transform_calculate(
                     pct='datum.count / datum.total'
                 ).transform_filter(alt.datum.pct > 0.04)
@@ -484,7 +516,7 @@ if uploaded_file:
                 st.markdown("---")
                 st.markdown("### 💡 **Analysis Insights**")
                 
-                avg_skills = active_df[skills].mean().sort_values()
+                avg_skills = cube.skill_means(selected_terms, active_student).dropna().sort_values()
                 
                 if not avg_skills.empty:
                     stat_col1, stat_col2 = st.columns(2)
@@ -509,68 +541,51 @@ if uploaded_file:
     # =====================================
     # 8. Report Export & Google Drive
     # =====================================
+    def write_student_zip(df_reports, out):
+        """One PDF per row, stored as Term/Name_report.pdf in a ZIP written to the file out."""
+        template = get_report_template()
+        records = df_reports.to_dict("records")
+        jobs = [template.job(r, f"Progress Report ({r['Term']})") for r in records]
+
+        # Very large exports are spread over a small process pool; PDFs come back in row order
+        zip_progress = st.progress(0, text="Rendering PDFs...")
+        pdfs = render_reports(
+            template, jobs,
+            workers=int(os.environ.get("PDF_WORKERS", 2)),
+            chunk_size=int(os.environ.get("PDF_CHUNK_SIZE", 250)),
+            progress=lambda done, total: zip_progress.progress(done / total, text=f"Rendered {done}/{total} PDFs"),
+            cache=get_render_cache(),
+        )
+
+        # Entries are deflated and written as they are rendered, never buffered in RAM
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for r, pdf_content in zip(records, pdfs):
+                # Organizing files in folders by Term
+                filename = f"{r['Term']}/{str(r['Student Name']).strip()}_report.pdf"
+                zf.writestr(filename, pdf_content)
+        zip_progress.empty()
+
     st.divider()
     col_drive, col_zip = st.columns(2)
     
     with col_zip:
         st.markdown("<div style='margin-top: 85px;'></div>", unsafe_allow_html=True)
-        if st.button("📦 Generate Student PDF ZIP"):
-            z_buf = BytesIO()
-            # Use 'zf' as the zip handle
-            with zipfile.ZipFile(z_buf, "w") as zf:
-                for _, r in df.iterrows():
-                    pdf = FPDF()
-                    pdf.add_page()
-                    
-                    # --- 1. ADD LOGO ---
-                    # Position: x=10, y=8 | Width: 33 (adjust as needed)
-                    # Ensure 'logo.png' exists in your root folder
-                    try:
-                        pdf.image("logo.png", x=100, y=8, w=33)
-                    except:
-                        # Fallback if logo is missing to prevent crash
-                        pdf.set_font("Arial", "I", 8)
-                        pdf.cell(0, 5, "[School Logo Placeholder]", ln=True)
-                    
-                    # Move cursor down so text doesn't overlap logo
-                    pdf.ln(20)
-                    # Header
-                    pdf.set_font("Arial", "B", 16)
-                    # Use 'r' here to match your loop variable
-                    pdf.cell(0, 10, f"Progress Report ({r['Term']})", ln=True)
-                    
-                    # Content
-                    pdf.set_font("Arial", "", 12)
-                    pdf.cell(0, 8, f"Student: {str(r['Student Name']).strip()}", ln=True)
-                    pdf.cell(0, 5, "-"*30, ln=True) # Divider line
-                    
-                    # Skill Scores
-                    for s in skills:
-                        score = r[s] if pd.notna(r[s]) else 0
-                        pdf.cell(0, 8, f"{s}: {score}", ln=True)
-                    
-                    # Final Stats
-                    pdf.cell(0, 5, "-"*30, ln=True)
-                    pdf.cell(0, 8, f"Average: {r['Average']:.2f}", ln=True)
-                    pdf.cell(0, 8, f"Grade: {r['Grade']}", ln=True)
-                    pdf.cell(0, 8, f"Remarks: {r['Remarks']}", ln=True)
-                    
-                    # Output PDF to string and write to ZIP
-                    # FPDF output(dest="S") returns a string in latin-1
-                    pdf_content = pdf.output(dest="S").encode("latin-1")
-                    
-                    # Organizing files in folders by Term
-                    filename = f"{r['Term']}/{str(r['Student Name']).strip()}_report.pdf"
-                    zf.writestr(filename, pdf_content)
-            
-            # Final download button
-            st.download_button(
-                label="⬇️ Download ZIP",
-                data=z_buf.getvalue(),
-                file_name=f"Student_Reports_{selected_sheet}.zip",
-                mime="application/zip",
-                use_container_width=True
-            )
+        # Reuse the last ZIP for this exact data and report layout; build it only on request
+        zip_key = export_fingerprint(f"zip|{get_report_template().version}", df, selected_sheet, selected_terms)
+        zip_path = get_export_cache().get(zip_key, ".zip")
+        if zip_path is None and st.button("📦 Generate Student PDF ZIP"):
+            zip_path = get_export_cache().build_stream(zip_key, ".zip", lambda f: write_student_zip(df, f))
+
+        if zip_path:
+            # Final download button, served from the cached file (no extra in-memory copy)
+            with open(zip_path, "rb") as f:
+                st.download_button(
+                    label="⬇️ Download ZIP",
+                    data=f,
+                    file_name=f"Student_Reports_{selected_sheet}.zip",
+                    mime="application/zip",
+                    use_container_width=True
+                )
 
     with col_drive:
         folder_id_input = st.text_input("G-Drive Folder ID", "0ALncbMfl-gjdUk9PVA")
@@ -593,91 +608,47 @@ if uploaded_file:
                 else:
                     prog_bar = st.progress(0)
                     status_text = st.empty() # Placeholder for "Processing Alice Tan..."
-                    current_step = 0
-        
+                    stats = UploadStats()
+                    # Shared by every call of this upload: rate limit + retries on quota / 5xx errors
+                    scheduler = RequestScheduler(rate=float(os.environ.get("DRIVE_RPS", 10)))
+
+                    # 1. RENDER PDFs
+                    reports = []  # (term, file name, PDF bytes)
+                    template = get_report_template()
                     for term in selected_terms:
                         term_clean = term.strip()
-                        parent_id = folder_id_input.strip()
-        
-                        # 1. FIND OR CREATE TERM FOLDER
-                        query_folder = (
-                            f"name='{term_clean}' "
-                            f"and mimeType='application/vnd.google-apps.folder' "
-                            f"and '{parent_id}' in parents and trashed=false"
-                        )
-                        folder_search = drive_service.files().list(
-                            q=query_folder, fields="files(id)", 
-                            includeItemsFromAllDrives=True, supportsAllDrives=True
-                        ).execute()
-                        
-                        existing_folders = folder_search.get('files', [])
-                        if existing_folders:
-                            term_folder_id = existing_folders[0]['id']
-                        else:
-                            folder_metadata = {'name': term_clean, 'mimeType': 'application/vnd.google-apps.folder', 'parents': [parent_id]}
-                            term_folder = drive_service.files().create(body=folder_metadata, fields='id', supportsAllDrives=True).execute()
-                            term_folder_id = term_folder['id']
-        
-                        # 2. UPLOAD / OVERWRITE PDFs
                         df_term = df[df["Term"] == term]
-                        
-                        for _, row in df_term.iterrows():
-                            student_name = row['Student Name'].strip()
-                            file_name = f"{selected_sheet}_{student_name}_report.pdf"
-                            
-                            # Update status text
-                            status_text.text(f"Uploading: {file_name}")
-        
-                            # --- Generate PDF ---
-                            pdf = FPDF()
-                            pdf.add_page()
-
-                            # Position: x=10, y=8 | Width: 33 (adjust as needed)
-                            # Ensure 'logo.png' exists in your root folder
-                            try:
-                                pdf.image("logo.png", x=100, y=8, w=33)
-                            except:
-                                # Fallback if logo is missing to prevent crash
-                                pdf.set_font("Arial", "I", 8)
-                                pdf.cell(0, 5, "[School Logo Placeholder]", ln=True)
-                            
-                            # Move cursor down so text doesn't overlap logo
-                            pdf.ln(20)
-                            
-                            pdf.set_font("Arial", "B", 16)
-                            pdf.cell(0, 10, f"Progress Report ({selected_sheet}_{term_clean})", ln=True)
-                            pdf.set_font("Arial", "", 12)
-                            pdf.cell(0, 8, f"Student: {student_name}", ln=True)
-                            pdf.cell(0, 5, "-"*30, ln=True) # Divider line
-                            for s in skills:
-                                pdf.cell(0, 8, f"{s}: {row[s]}", ln=True)
-                            pdf.cell(0, 5, "-"*30, ln=True)
-                            pdf.cell(0, 8, f"Average: {row['Average']:.2f}", ln=True)
-                            pdf.cell(0, 8, f"Grade: {row['Grade']}", ln=True)
-                            pdf.cell(0, 8, f"Remarks: {row['Remarks']}", ln=True)
-        
-                            pdf_bytes = BytesIO()
-                            pdf_bytes.write(pdf.output(dest="S").encode("latin-1"))
-                            pdf_bytes.seek(0)
-                            media = MediaIoBaseUpload(pdf_bytes, mimetype='application/pdf', resumable=True)
-        
-                            # --- Check if FILE already exists for Overwrite ---
-                            query_file = f"name='{file_name}' and '{term_folder_id}' in parents and trashed=false"
-                            file_search = drive_service.files().list(q=query_file, fields="files(id)", includeItemsFromAllDrives=True, supportsAllDrives=True).execute()
-                            existing_files = file_search.get('files', [])
-        
-                            if existing_files:
-                                drive_service.files().update(fileId=existing_files[0]['id'], media_body=media, supportsAllDrives=True).execute()
-                            else:
-                                file_metadata = {'name': file_name, 'parents': [term_folder_id]}
-                                drive_service.files().create(body=file_metadata, media_body=media, fields='id', supportsAllDrives=True).execute()
-        
-                            # --- FIX: Increment progress based on ACTUAL processed rows ---
-                            current_step += 1
-                            prog_bar.progress(current_step / total_steps)
+                        status_text.text(f"Preparing reports for {term_clean}...")
+                        title = f"Progress Report ({selected_sheet}_{term_clean})"
+                        pdfs = render_reports(template, [template.job(r, title) for r in df_term.to_dict("records")],
+                                              cache=get_render_cache())
+                        for r, pdf in zip(df_term.to_dict("records"), pdfs):
+                            reports.append((term_clean, f"{selected_sheet}_{str(r['Student Name']).strip()}_report.pdf", pdf))
+
+                    # 2. UPLOAD / OVERWRITE on parallel workers (unchanged reports are skipped by MD5);
+                    #    folder IDs are remembered in the manifest between uploads
+                    def show_progress(done, total):
+                        status_text.text(f"Uploaded {done}/{total} reports")
+                        prog_bar.progress(done / total)
+
+                    # max_age=0: always re-list the term folders, since the scheduler (with its
+                    # own manifest) may have overwritten these files since the last app upload
+                    manifest = DriveManifest(os.environ.get(
+                        "DRIVE_MANIFEST_PATH", os.path.join(tempfile.gettempdir(), "student_report_drive_manifest.json")
+                    ), max_age=0)
+                    outcomes, errors = sync_reports(
+                        drive_service, service_factory(credentials), folder_id_input.strip(), reports,
+                        workers=int(os.environ.get("UPLOAD_WORKERS", 4)), resumable=True, progress=show_progress,
+                        scheduler=scheduler, manifest=manifest,
+                    )
+                    for outcome in outcomes:
+                        stats.add(outcome)
+                    for i, error in [(i, e) for i, e in errors.items() if e is not None][:5]:
+                        st.warning(f"{reports[i][1]}: {error}")
         
                     status_text.empty() # Clear status when done
-                    st.success(f"✅ Successfully processed {total_steps} reports!")
+                    st.success(f"✅ Successfully processed {total_steps} reports! {stats.summary()}")
+                    st.caption(scheduler.summary())
         
             except Exception as e:
                 st.error(f"Google Drive operation failed: {e}")
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+# =====================================
+# Data-quality audit
+# =====================================
+# rule -> label shown in the editor's Status column (first failing rule wins)
+AUDIT_RULES = {
+    "non_numeric": "🚨 NOT A NUMBER",
+    "missing": "🚨 MISSING",
+    "out_of_range": "🚨 OUT OF RANGE",
+    "duplicate": "🚨 DUPLICATE",
+}
+OK_LABEL = "✅ OK"
+
+
+def audit_table(df, skills, non_numeric=None, score_range=(0, 100)):
+    """Returns one boolean column per audit rule, indexed like df.
+
+    non_numeric is the {skill: [row labels]} map recorded by normalize_table;
+    a coerced cell stops being flagged once it has been given a number.
+    """
+    scores = df[skills]
+    low, high = score_range
+
+    flags = pd.DataFrame(index=df.index)
+    flags["missing"] = scores.isna().any(axis=1)
+
+    coerced = pd.Series(False, index=df.index)
+    for skill, labels in (non_numeric or {}).items():
+        if skill in scores.columns:
+            coerced |= df.index.isin(labels) & scores[skill].isna()
+    flags["non_numeric"] = coerced
+
+    flags["out_of_range"] = ((scores < low) | (scores > high)).any(axis=1)
+    flags["duplicate"] = df.duplicated(subset=["Term", "Student Name"], keep=False) & df["Student Name"].notna()
+    return flags
+
+
+def status_labels(flags):
+    """Status text per row: the label of the first failing rule, else OK."""
+    return pd.Series(
+        np.select([flags[rule].to_numpy() for rule in AUDIT_RULES], list(AUDIT_RULES.values()), OK_LABEL),
+        index=flags.index,
+    )
+
+
+def audit_summary(flags):
+    """Number of rows failing each rule."""
+    return flags.sum().astype(int)